@@ -6,10 +6,9 @@ Run with: python ifc_standalone.py
 Then open: http://localhost:8080
 """
 
-from flask import Flask, request, jsonify, send_file, render_template_string
+from flask import Flask, request, jsonify, send_file, g, Response
 from flask_cors import CORS
-import ifcopenshell
-import ifcopenshell.util.element as Element
+from flask.json.provider import DefaultJSONProvider
 from pathlib import Path
 import tempfile
 import os
@@ -18,147 +17,3483 @@ import json
 from datetime import datetime
 import uuid
 import xml.etree.ElementTree as ET
+from collections import defaultdict
+import logging
+import re
+import sys
+import threading
+import time
+import gzip
+import hashlib
+import shutil
+import zipfile
+from collections import OrderedDict
+import importlib
+import weakref
+import bisect
+import math
+from array import array
+import csv
+import io
+from xml.sax.saxutils import escape as xml_escape
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import wraps
+
+
+class LazyModule:
+    """Module proxy that defers the import until first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# ifcopenshell is heavy to import; only pay for it when a model is loaded
+ifcopenshell = LazyModule("ifcopenshell")
+Element = LazyModule("ifcopenshell.util.element")
+np = LazyModule("numpy")
+
+# ============================================================================
+# FLASK APP SETUP
+# ============================================================================
+
+app = Flask(__name__)
+CORS(app)
+app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB
+app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
+app.config['IN_MEMORY_PARSE_LIMIT'] = int(os.environ.get('IFC_IN_MEMORY_PARSE_MB', 16)) * 1024 * 1024
+app.config['MEMORY_BUDGET'] = int(os.environ.get('IFC_MEMORY_BUDGET_MB', 24 * 1024)) * 1024 * 1024
+app.config['ADMISSION_MAX_QUEUED'] = int(os.environ.get('IFC_ADMISSION_MAX_QUEUED', 4))
+app.config['ADMISSION_QUEUE_TIMEOUT'] = float(os.environ.get('IFC_ADMISSION_QUEUE_TIMEOUT', 30))
+app.config['MAX_DECOMPRESSED_SIZE'] = int(os.environ.get('IFC_MAX_DECOMPRESSED_MB', 4096)) * 1024 * 1024
+app.config['MAX_COMPRESSION_RATIO'] = float(os.environ.get('IFC_MAX_COMPRESSION_RATIO', 100))
+app.config['GEOMETRY_CACHE_SIZE'] = int(os.environ.get('IFC_GEOMETRY_CACHE_SIZE', 16))
+app.config['GEOMETRY_THREADS'] = int(os.environ.get('IFC_GEOMETRY_THREADS', os.cpu_count() or 1))
+app.config['MODEL_CACHE_SIZE'] = int(os.environ.get('IFC_MODEL_CACHE_SIZE', 8))
+app.config['JOB_TIME_LIMIT'] = float(os.environ.get('IFC_JOB_TIME_LIMIT', 0))  # seconds, 0 = unlimited
+app.config['JOB_DISCONNECT_GRACE'] = float(os.environ.get('IFC_JOB_DISCONNECT_GRACE', 10))
+app.config['FEDERATION_WORKERS'] = int(os.environ.get('IFC_FEDERATION_WORKERS', 4))
+app.config['CORRECTION_PROFILES'] = os.environ.get('IFC_CORRECTION_PROFILES')  # file or directory
+app.config['CORRECTION_WORKERS'] = int(os.environ.get('IFC_CORRECTION_WORKERS', os.cpu_count() or 1))
+
+ALLOWED_EXTENSIONS = {'ifc', 'ifcxml'}
+COMPRESSED_SUFFIXES = {'.ifczip': 'zip', '.gz': 'gzip', '.zst': 'zstd'}
+ALLOWED_IDS_EXTENSIONS = {'ids', 'xml'}
+
+# Store processed files temporarily
+PROCESSED_FILES = {}
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("ifc_toolkit")
+
+# ============================================================================
+# HELPER FUNCTIONS
+# ============================================================================
+
+def allowed_file(filename):
+    model_name, _ = split_compression(filename)
+    return '.' in model_name and model_name.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def split_compression(filename):
+    """Split 'model.ifc.gz' into ('model.ifc', 'gzip'); .ifczip maps to .ifc."""
+    lower = filename.lower()
+    for suffix, compression in COMPRESSED_SUFFIXES.items():
+        if lower.endswith(suffix):
+            stem = filename[:-len(suffix)]
+            return (stem + '.ifc' if compression == 'zip' else stem), compression
+    return filename, None
+
+
+def allowed_ids_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IDS_EXTENSIONS
+
+
+def is_ifcxml(filename):
+    return filename.lower().endswith('.ifcxml')
+
+
+def reject_ifcxml(filename, feature):
+    """Refuse an ifcXML model for a feature that needs the STEP reader."""
+    if is_ifcxml(split_compression(filename)[0]):
+        raise UploadError(f"{feature} is not available for ifcXML models", 415)
+
+
+def get_element_details(ifc_file, element, vocabulary, psets=None):
+    """Get complete element details as a compact record.
+
+    With psets, a frozenset of names, only those property sets are decoded.
+    """
+    # Get spatial location
+    location = get_spatial_location(element)
+    
+    # Get properties, inheriting from the element's type object; quantity
+    # sets are reported once, in SI units, under quantities
+    properties, sources = get_pset_resolver(ifc_file).resolve(element, psets or None, qtos=False)
+    
+    # Get quantities
+    quantities = get_element_quantities(element, get_unit_factors(ifc_file))
+    
+    # Materials and classifications, from the element or else its type
+    materials, classifications = get_association_index(ifc_file).lookup(element)
+    
+    return ElementRecord(
+        vocabulary,
+        getattr(element, "GlobalId", ""),
+        getattr(element, "Name", "N/A"),
+        element.is_a(),
+        getattr(element, "PredefinedType", None),
+        getattr(element, "Description", None),
+        location["storey"],
+        location["building"],
+        properties,
+        sources,
+        quantities,
+        materials=materials,
+        classifications=classifications,
+    )
+
+
+def summarize_elements(records):
+    """Count element records by class, storey and building."""
+    by_class = {}
+    by_storey = {}
+    by_building = {}
+    
+    for record in records:
+        # Count by class
+        by_class[record.ifc_class] = by_class.get(record.ifc_class, 0) + 1
+        
+        # Count by storey
+        if record.storey:
+            storey_name = record.storey["name"]
+            by_storey[storey_name] = by_storey.get(storey_name, 0) + 1
+        
+        # Count by building
+        if record.building:
+            building_name = record.building["name"]
+            by_building[building_name] = by_building.get(building_name, 0) + 1
+    
+    return make_summary(len(records), by_class, by_storey, by_building)
+
+
+def make_summary(total, by_class, by_storey, by_building):
+    return {
+        "totalElements": total,
+        "byClass": by_class,
+        "byStorey": by_storey,
+        "byBuilding": by_building,
+        "uniqueClasses": len(by_class),
+        "uniqueStoreys": len(by_storey),
+        "uniqueBuildings": len(by_building)
+    }
+
+
+def product_classes(schema_name):
+    """Names of all instantiable IfcProduct subtypes in a schema."""
+    return entity_subtypes(schema_name, "IfcProduct")
+
+
+def entity_subtypes(schema_name, entity_name):
+    """Names of an entity and its subtypes in a schema that can be instantiated."""
+    schema = ifcopenshell.ifcopenshell_wrapper.schema_by_name(schema_name)
+    pending = [schema.declaration_by_name(entity_name)]
+    names = []
+    while pending:
+        declaration = pending.pop()
+        if not declaration.is_abstract():
+            names.append(declaration.name())
+        pending.extend(declaration.subtypes())
+    return names
+
+
+def summarize_products(elements):
+    """Count a selection of products by class, storey and building."""
+    by_class = {}
+    by_storey = {}
+    by_building = {}
+    for element in elements:
+        by_class[element.is_a()] = by_class.get(element.is_a(), 0) + 1
+        location = get_spatial_location(element)
+        if location["storey"]:
+            storey_name = location["storey"]["name"]
+            by_storey[storey_name] = by_storey.get(storey_name, 0) + 1
+        if location["building"]:
+            building_name = location["building"]["name"]
+            by_building[building_name] = by_building.get(building_name, 0) + 1
+    return make_summary(len(elements), by_class, by_storey, by_building)
+
+
+def summarize_model(ifc_file):
+    """Count products by class, storey and building without extracting elements.
+
+    Class counts come from the entity table per concrete IfcProduct subtype;
+    storey and building counts from the containment relationships, matching
+    what get_spatial_location reports per element.
+    """
+    by_class = {}
+    for name in product_classes(ifc_file.schema):
+        count = len(ifc_file.by_type(name, include_subtypes=False))
+        if count:
+            by_class[name] = count
+    
+    by_storey = {}
+    by_building = {}
+    for rel in ifc_file.by_type("IfcRelContainedInSpatialStructure"):
+        storey = rel.RelatingStructure
+        if not storey.is_a("IfcBuildingStorey"):
+            continue
+        count = len(rel.RelatedElements)
+        by_storey[storey.Name] = by_storey.get(storey.Name, 0) + count
+        for dec in storey.Decomposes:
+            if dec.RelatingObject.is_a("IfcBuilding"):
+                building_name = dec.RelatingObject.Name
+                by_building[building_name] = by_building.get(building_name, 0) + count
+    
+    return make_summary(sum(by_class.values()), by_class, by_storey, by_building)
+
+
+def get_spatial_location(element):
+    """Get spatial hierarchy location."""
+    location = {"storey": None, "building": None, "site": None}
+    
+    if hasattr(element, "ContainedInStructure"):
+        for rel in element.ContainedInStructure:
+            if hasattr(rel, "RelatingStructure"):
+                container = rel.RelatingStructure
+                
+                if container.is_a("IfcBuildingStorey"):
+                    location["storey"] = {
+                        "id": getattr(container, "GlobalId", ""),
+                        "name": getattr(container, "Name", ""),
+                        "elevation": getattr(container, "Elevation", None)
+                    }
+                    
+                    if hasattr(container, "Decomposes"):
+                        for dec in container.Decomposes:
+                            if hasattr(dec, "RelatingObject"):
+                                building = dec.RelatingObject
+                                if building.is_a("IfcBuilding"):
+                                    location["building"] = {
+                                        "id": getattr(building, "GlobalId", ""),
+                                        "name": getattr(building, "Name", "")
+                                    }
+    
+    return location
+
+
+def get_element_quantities(element, unit_factors=None):
+    """Extract quantities, converted to SI units."""
+    quantities = {}
+    if unit_factors is None:
+        unit_factors = get_unit_factors(element.file)
+    
+    for definition in getattr(element, "IsDefinedBy", None) or ():
+        if not definition.is_a("IfcRelDefinesByProperties"):
+            continue
+        prop_def = definition.RelatingPropertyDefinition
+        
+        if prop_def.is_a("IfcElementQuantity"):
+            qto_name = prop_def.Name or "Quantities"
+            
+            for quantity in prop_def.Quantities or ():
+                quantity_type = QUANTITY_TYPES.get(quantity.is_a())
+                if quantity_type is None:
+                    continue
+                
+                value_index, unit_type, unit = quantity_type
+                value = quantity[value_index]
+                if value is None:
+                    continue
+                
+                if unit_type is not None:
+                    if quantity.Unit is not None:
+                        value *= unit_factors.named_unit(quantity.Unit)
+                    else:
+                        value *= unit_factors.get(unit_type, 1.0)
+                
+                quantities[quantity.Name] = {
+                    "value": value,
+                    "unit": unit,
+                    "quantitySet": qto_name
+                }
+    
+    return quantities
+
+
+# ============================================================================
+# ELEMENT RECORDS
+# ============================================================================
+
+GEOMETRY_MEASURES = ("volume", "surfaceArea", "footprintArea")
+MATERIAL_FIELDS = ("name", "usage", "thickness", "fraction")
+CLASSIFICATION_FIELDS = ("system", "code", "name")
+_NAN = float("nan")
+
+
+def _intern(value):
+    """Intern short strings; names and many property values repeat across elements."""
+    if type(value) is str and len(value) <= 64:
+        return sys.intern(value)
+    return value
+
+
+def _from_float(value):
+    return None if math.isnan(value) else value
+
+
+def _entry_dict(fields, entry):
+    """A material or classification tuple as a dict, without the empty fields."""
+    return {field: value for field, value in zip(fields, entry) if value is not None}
+
+
+class Vocabulary:
+    """Pieces shared by the element records of one model.
+
+    Elements of the same type carry the same pset and quantity layouts and
+    point at the same storey and building, so each distinct layout and
+    location is stored once.
+    """
+
+    def __init__(self):
+        self._shared = {}
+
+    def share(self, value):
+        return self._shared.setdefault(value, value)
+
+    def location(self, location):
+        if not location:
+            return None
+        return self._shared.setdefault(("location",) + tuple(location.items()), location)
+
+
+class ElementRecord:
+    """Compact element record; as_dict() produces the API's JSON shape.
+
+    Property values are a flat tuple aligned with a shared layout of
+    (pset name, source, property names) entries. Quantity values are a
+    float array aligned with a shared layout of (name, quantity set, unit)
+    entries. Geometry is a float array of the measures followed by the
+    bounding box. NaN stands for a missing number. Materials and
+    classifications are tuples of MATERIAL_FIELDS and CLASSIFICATION_FIELDS
+    tuples, shared by all elements of one association.
+    """
+
+    __slots__ = ("id", "name", "ifc_class", "predefined_type", "description", "storey", "building",
+                 "pset_layout", "pset_values", "qto_layout", "qto_values", "geometry",
+                 "materials", "classifications")
+
+    def __init__(self, vocabulary, global_id, name, ifc_class, predefined_type, description,
+                 storey, building, properties, sources, quantities, geometry=None,
+                 materials=(), classifications=()):
+        self.id = global_id
+        self.name = _intern(name)
+        self.ifc_class = sys.intern(ifc_class)
+        self.predefined_type = _intern(predefined_type)
+        self.description = _intern(description)
+        self.storey = vocabulary.location(storey)
+        self.building = vocabulary.location(building)
+        self.set_properties(vocabulary, properties, sources)
+        self.set_quantities(vocabulary, quantities)
+        self.set_geometry(geometry)
+        self.materials = materials
+        self.classifications = classifications
+
+    @classmethod
+    def from_dict(cls, vocabulary, data):
+        return cls(vocabulary, data["id"], data["name"], data["class"], data.get("predefinedType"),
+                   data.get("description"), data.get("storey"), data.get("building"),
+                   data.get("properties") or {}, data.get("propertySources") or {},
+                   data.get("quantities") or {}, data.get("geometry"),
+                   tuple(tuple(m.get(f) for f in MATERIAL_FIELDS) for m in data.get("materials") or ()),
+                   tuple(tuple(c.get(f) for f in CLASSIFICATION_FIELDS) for c in data.get("classifications") or ()))
+
+    def set_properties(self, vocabulary, properties, sources):
+        self.pset_layout = vocabulary.share(tuple(
+            (sys.intern(pset_name), sources.get(pset_name), tuple(sys.intern(name) for name in props))
+            for pset_name, props in properties.items()
+        ))
+        self.pset_values = tuple(_intern(value) for props in properties.values() for value in props.values())
+
+    def set_quantities(self, vocabulary, quantities):
+        self.qto_layout = vocabulary.share(tuple(
+            (sys.intern(name), sys.intern(qty["quantitySet"]), _intern(qty["unit"]))
+            for name, qty in quantities.items()
+        ))
+        self.qto_values = array("d", (_NAN if qty["value"] is None else qty["value"]
+                                      for qty in quantities.values())) if quantities else ()
+
+    def set_geometry(self, geometry):
+        if geometry is None:
+            self.geometry = None
+            return
+        measures = (_NAN if geometry[key] is None else geometry[key] for key in GEOMETRY_MEASURES)
+        self.geometry = array("d", [*measures, *geometry["bbox"]["min"], *geometry["bbox"]["max"]])
+
+    def psets(self):
+        """Yield (pset name, source, {property: value}) per property set."""
+        start = 0
+        for pset_name, source, names in self.pset_layout:
+            end = start + len(names)
+            yield pset_name, source, dict(zip(names, self.pset_values[start:end]))
+            start = end
+
+    def properties(self):
+        return {pset_name: props for pset_name, _, props in self.psets()}
+
+    def property_sources(self):
+        return {pset_name: source for pset_name, source, _ in self.pset_layout if source is not None}
+
+    def quantities(self):
+        return {
+            name: {"value": _from_float(value), "unit": unit, "quantitySet": qset}
+            for (name, qset, unit), value in zip(self.qto_layout, self.qto_values)
+        }
+
+    def bbox(self):
+        """(min, max) corners of the measured geometry, or None."""
+        if self.geometry is None:
+            return None
+        return self.geometry[3:6].tolist(), self.geometry[6:9].tolist()
+
+    def geometry_dict(self):
+        if self.geometry is None:
+            return None
+        box_min, box_max = self.bbox()
+        result = {key: _from_float(value) for key, value in zip(GEOMETRY_MEASURES, self.geometry)}
+        result["bbox"] = {"min": box_min, "max": box_max}
+        return result
+
+    def as_dict(self):
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "class": self.ifc_class,
+            "predefinedType": self.predefined_type,
+            "description": self.description,
+            "storey": self.storey,
+            "building": self.building,
+            "site": None,
+            "properties": self.properties(),
+            "propertySources": self.property_sources(),
+            "quantities": self.quantities(),
+        }
+        if self.geometry is not None:
+            data["geometry"] = self.geometry_dict()
+        if self.materials:
+            data["materials"] = [_entry_dict(MATERIAL_FIELDS, m) for m in self.materials]
+        if self.classifications:
+            data["classifications"] = [_entry_dict(CLASSIFICATION_FIELDS, c) for c in self.classifications]
+        return data
+
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Serialize element records only when a response is encoded."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ElementRecord):
+            return o.as_dict()
+        if type(o).__module__ == "numpy":
+            # Scalars and arrays from the numpy-based rollups and indexes
+            return o.item() if isinstance(o, np.generic) else o.tolist()
+        return DefaultJSONProvider.default(o)
+
+
+app.json = RecordJSONProvider(app)
+
+
+# ============================================================================
+# UPLOADS
+# ============================================================================
+
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+# Small archives may legitimately expand beyond the ratio limit
+MIN_RATIO_CHECK_SIZE = 64 * 1024 * 1024
+
+
+class UploadError(Exception):
+    """Upload that cannot be accepted, with the HTTP status to report."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _stream_size(stream):
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def _copy_limited(source, target, compressed_size):
+    """Copy a decompressing stream, aborting on decompression bombs."""
+    max_size = app.config['MAX_DECOMPRESSED_SIZE']
+    max_ratio = app.config['MAX_COMPRESSION_RATIO']
+    written = 0
+    while True:
+        chunk = source.read(DECOMPRESS_CHUNK_SIZE)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if written > max_size:
+            raise UploadError(
+                f"Decompressed model exceeds the {max_size // 2 ** 20} MB limit", 413)
+        if written > MIN_RATIO_CHECK_SIZE and written > compressed_size * max_ratio:
+            raise UploadError(
+                f"Compression ratio exceeds {max_ratio:g}:1, refusing to decompress", 413)
+        target.write(chunk)
+
+
+def _open_zip_member(stream):
+    """Open the IFC member of an .ifczip archive for streaming reads."""
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise UploadError("Invalid .ifczip archive")
+    members = [m for m in archive.infolist()
+               if not m.is_dir() and allowed_file(m.filename) and split_compression(m.filename)[1] is None]
+    if len(members) != 1:
+        raise UploadError("An .ifczip archive must contain exactly one .ifc or .ifcxml file")
+    member = members[0]
+    if member.file_size > app.config['MAX_DECOMPRESSED_SIZE']:
+        raise UploadError("Decompressed model exceeds the size limit", 413)
+    return archive.open(member), member.filename, member.compress_size
+
+
+def _open_decompressor(stream, compression):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            # A missing server package, not a bad upload
+            raise UploadError("Install the 'zstandard' package to accept .zst uploads", 501)
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    raise UploadError(f"Unsupported compression: {compression}")
+
+
+class Spool:
+    """A decompressed upload, hashed as it is written.
+
+    Content stays in memory until it outgrows IN_MEMORY_PARSE_LIMIT and then
+    moves to a private file in UPLOAD_FOLDER, so concurrent uploads with the
+    same name never collide. discard() must be called on every code path.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.size = 0
+        self.path = None
+        self._digest = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._limit = app.config['IN_MEMORY_PARSE_LIMIT']
+
+    def write(self, chunk):
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        if self._file is None and self.size > self._limit:
+            self._spill()
+        (self._file or self._buffer).write(chunk)
+        return len(chunk)
+
+    def _spill(self):
+        fd, self.path = tempfile.mkstemp(
+            prefix="ifc-", suffix=os.path.splitext(self.name)[1], dir=app.config['UPLOAD_FOLDER'])
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    @property
+    def sha256(self):
+        """Content hash; the cache key for a model revision."""
+        return self._digest.hexdigest()
+
+    def open(self):
+        """Open the content as a binary stream."""
+        if self._buffer is not None:
+            return io.BytesIO(self._buffer.getvalue())
+        return open(self.path, "rb")
+
+    def schema(self):
+        if is_ifcxml(self.name):
+            return "IFCXML"
+        with self.open() as stream:
+            return detect_schema(stream)
+
+    def open_ifc(self):
+        """Parse with ifcopenshell, from memory when the content was small."""
+        if self._buffer is not None and not is_ifcxml(self.name):
+            try:
+                text = str(self._buffer.getbuffer(), "utf-8")
+            except UnicodeDecodeError:
+                pass
+            else:
+                return ifcopenshell.file.from_string(text)
+        return ifcopenshell.open(self.to_file())
+
+    def to_file(self):
+        """Move the content to disk if it is still in memory; returns the path."""
+        if self._buffer is not None:
+            self._spill()
+            self.close()
+        return self.path
+
+    def discard(self):
+        self.close()
+        self._buffer = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def ingest_upload(file):
+    """Stream an upload into a Spool, decompressing .ifczip/.gz/.zst on the fly.
+
+    The upload is read once: decompression, hashing and spooling happen in
+    the same pass. The spool is named after the model file, which for
+    archives is the member inside.
+    """
+    model_name, compression = split_compression(file.filename)
+    stream = file.stream
+    spool = None
+    try:
+        if compression is None:
+            spool = Spool(secure_filename(model_name))
+            shutil.copyfileobj(stream, spool, DECOMPRESS_CHUNK_SIZE)
+        else:
+            compressed_size = _stream_size(stream)
+            if compression == 'zip':
+                source, model_name, compressed_size = _open_zip_member(stream)
+            else:
+                source = _open_decompressor(stream, compression)
+            spool = Spool(secure_filename(os.path.basename(model_name)))
+            with source:
+                _copy_limited(source, spool, compressed_size)
+        spool.close()
+        return spool
+    except UploadError:
+        if spool:
+            spool.discard()
+        raise
+    except (OSError, EOFError, zipfile.BadZipFile) as e:
+        if spool:
+            spool.discard()
+        raise UploadError(f"Could not read upload: {e}")
+
+
+# ============================================================================
+# PROPERTY SETS
+# ============================================================================
+
+def _clean_psets(psets):
+    """Drop the ifcopenshell 'id'/'type' bookkeeping keys and empty sets."""
+    cleaned = {}
+    for pset_name, props in psets.items():
+        if isinstance(props, dict) and pset_name not in ["id", "type"]:
+            clean_props = {k: v for k, v in props.items() if k not in ["id", "type"]}
+            if clean_props:
+                cleaned[pset_name] = clean_props
+    return cleaned
+
+
+def _property_definitions(entity):
+    """The property set definitions attached to an object or type object."""
+    if entity.is_a("IfcTypeObject"):
+        yield from entity.HasPropertySets or ()
+        return
+    for relationship in getattr(entity, "IsDefinedBy", None) or ():
+        if relationship.is_a("IfcRelDefinesByProperties"):
+            definition = relationship.RelatingPropertyDefinition
+            # IfcPropertySetDefinitionSet wraps a list of definitions
+            if definition.is_a("IfcPropertySetDefinitionSet"):
+                yield from definition.wrappedValue
+            else:
+                yield definition
+
+
+def _decode_psets(entity, names=None, qtos=True):
+    """Decode an entity's own psets like Element.get_psets; with names, only those sets.
+
+    qtos=False leaves out IfcElementQuantity sets, like psets_only.
+    """
+    psets = {}
+    for definition in _property_definitions(entity):
+        if names is not None and definition.Name not in names:
+            continue
+        if not qtos and definition.is_a("IfcElementQuantity"):
+            continue
+        psets.setdefault(definition.Name, {}).update(Element.get_property_definition(definition))
+    return _clean_psets(psets)
+
+
+class PsetResolver:
+    """Resolve element psets, decoding each type object's psets only once.
+
+    Occurrences that share a type reuse the type's decoded psets and only
+    their own psets are read per element. With a set of pset names, other
+    property sets are skipped without being decoded. The returned dicts may
+    be shared between elements and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._type_psets = {}
+        self._lock = threading.Lock()
+
+    def type_psets(self, type_object, names=None, qtos=True):
+        key = (type_object.id(), names, qtos)
+        psets = self._type_psets.get(key)
+        if psets is None:
+            CACHE_REQUESTS.inc(cache="type_psets", result="miss")
+            psets = _decode_psets(type_object, names, qtos)
+            with self._lock:
+                self._type_psets[key] = psets
+        else:
+            CACHE_REQUESTS.inc(cache="type_psets", result="hit")
+        return psets
+
+    def resolve(self, element, names=None, qtos=True):
+        """Return (psets, sources) with sources 'type', 'occurrence' or 'both' per pset.
+
+        names, a frozenset, limits the result to those property sets, and
+        qtos=False leaves out the quantity sets.
+        """
+        type_object = Element.get_type(element)
+        inherited = self.type_psets(type_object, names, qtos) if type_object is not None else {}
+        own = _decode_psets(element, names, qtos)
+        if not own:
+            return inherited, dict.fromkeys(inherited, "type")
+        
+        psets = dict(inherited)
+        sources = dict.fromkeys(inherited, "type")
+        for pset_name, props in own.items():
+            if pset_name in inherited:
+                psets[pset_name] = {**inherited[pset_name], **props}
+                sources[pset_name] = "both"
+            else:
+                psets[pset_name] = props
+                sources[pset_name] = "occurrence"
+        return psets, sources
+
+
+_PSET_RESOLVERS = weakref.WeakKeyDictionary()
+
+
+def get_pset_resolver(ifc_file):
+    """Return the per-model type pset cache."""
+    with _MODEL_CACHE_LOCK:
+        resolver = _PSET_RESOLVERS.get(ifc_file)
+        if resolver is None:
+            resolver = _PSET_RESOLVERS[ifc_file] = PsetResolver()
+    return resolver
+
+
+# ============================================================================
+# UNITS
+# ============================================================================
+
+SI_PREFIXES = {
+    "EXA": 1e18, "PETA": 1e15, "TERA": 1e12, "GIGA": 1e9, "MEGA": 1e6,
+    "KILO": 1e3, "HECTO": 1e2, "DECA": 1e1, "DECI": 1e-1, "CENTI": 1e-2,
+    "MILLI": 1e-3, "MICRO": 1e-6, "NANO": 1e-9, "PICO": 1e-12,
+    "FEMTO": 1e-15, "ATTO": 1e-18,
+}
+
+# Prefixes on squared/cubed SI units apply to the base unit (mm² = 1e-6 m²)
+SI_UNIT_EXPONENTS = {"SQUARE_METRE": 2, "CUBIC_METRE": 3}
+
+# IFC masses are expressed in grams; SI output is kilograms
+SI_UNIT_SCALES = {"GRAM": 1e-3}
+
+# Quantity entity -> (index of the value attribute, unit type, SI unit label).
+# Indexing by position avoids a name lookup per quantity; the value always
+# follows Name, Description and Unit.
+QUANTITY_TYPES = {
+    "IfcQuantityLength": (3, "LENGTHUNIT", "m"),
+    "IfcQuantityArea": (3, "AREAUNIT", "m²"),
+    "IfcQuantityVolume": (3, "VOLUMEUNIT", "m³"),
+    "IfcQuantityWeight": (3, "MASSUNIT", "kg"),
+    "IfcQuantityTime": (3, "TIMEUNIT", "s"),
+    "IfcQuantityCount": (3, None, "count"),
+    "IfcQuantityNumber": (3, None, None),
+}
+
+
+class UnitFactors(dict):
+    """Factors that convert project units to SI, keyed by IFC unit type."""
+
+    def __init__(self, ifc_file):
+        super().__init__()
+        self._named = {}
+        assignments = ifc_file.by_type("IfcUnitAssignment")
+        for unit in (assignments[0].Units or ()) if assignments else ():
+            if unit.is_a("IfcNamedUnit") and unit.UnitType:
+                self[unit.UnitType] = self.named_unit(unit)
+
+    def named_unit(self, unit):
+        """Return the SI conversion factor for a single named unit."""
+        factor = self._named.get(unit.id())
+        if factor is None:
+            factor = self._named[unit.id()] = self._resolve(unit)
+        return factor
+
+    def _resolve(self, unit):
+        if unit.is_a("IfcSIUnit"):
+            prefix = SI_PREFIXES.get(unit.Prefix, 1.0) if unit.Prefix else 1.0
+            exponent = SI_UNIT_EXPONENTS.get(unit.Name, 1)
+            return prefix ** exponent * SI_UNIT_SCALES.get(unit.Name, 1.0)
+        if unit.is_a("IfcConversionBasedUnit") and unit.ConversionFactor:
+            measure = unit.ConversionFactor
+            value = measure.ValueComponent.wrappedValue
+            component = measure.UnitComponent
+            if component is not None and component.is_a("IfcNamedUnit"):
+                return value * self.named_unit(component)
+            return value
+        return 1.0
+
+
+_UNIT_FACTORS = weakref.WeakKeyDictionary()
+_MODEL_CACHE_LOCK = threading.Lock()
+
+
+def get_unit_factors(ifc_file):
+    """Resolve the model's IfcUnitAssignment once and cache it per model."""
+    with _MODEL_CACHE_LOCK:
+        factors = _UNIT_FACTORS.get(ifc_file)
+        if factors is None:
+            factors = _UNIT_FACTORS[ifc_file] = UnitFactors(ifc_file)
+    return factors
+
+
+# ============================================================================
+# MATERIALS AND CLASSIFICATIONS
+# ============================================================================
+
+def _material_entries(material, length_factor):
+    """Flatten any material select into (name, usage, thickness, fraction) tuples."""
+    if material.is_a("IfcMaterialLayerSetUsage"):
+        return _material_entries(material.ForLayerSet, length_factor)
+    if material.is_a("IfcMaterialLayerSet"):
+        return tuple(e for layer in material.MaterialLayers for e in _material_entries(layer, length_factor))
+    if material.is_a("IfcMaterialLayer"):
+        thickness = material.LayerThickness
+        return ((_intern(getattr(material.Material, "Name", None)), "layer",
+                 thickness * length_factor if thickness is not None else None, None),)
+    if material.is_a("IfcMaterialProfileSetUsage"):
+        return _material_entries(material.ForProfileSet, length_factor)
+    if material.is_a("IfcMaterialProfileSet"):
+        return tuple(e for profile in material.MaterialProfiles for e in _material_entries(profile, length_factor))
+    if material.is_a("IfcMaterialProfile"):
+        return ((_intern(getattr(material.Material, "Name", None)), "profile", None, None),)
+    if material.is_a("IfcMaterialConstituentSet"):
+        return tuple(e for constituent in material.MaterialConstituents or ()
+                     for e in _material_entries(constituent, length_factor))
+    if material.is_a("IfcMaterialConstituent"):
+        return ((_intern(getattr(material.Material, "Name", None)), "constituent", None, material.Fraction),)
+    if material.is_a("IfcMaterialList"):
+        return tuple((_intern(m.Name), "material", None, None) for m in material.Materials)
+    if material.is_a("IfcMaterial"):
+        return ((_intern(material.Name), "material", None, None),)
+    return ()
+
+
+def _classification_entry(reference):
+    """(system, code, name) of a classification reference, notation or system."""
+    if reference.is_a("IfcClassification"):
+        return (_intern(reference.Name), None, None)
+    if reference.is_a("IfcClassificationNotation"):
+        code = ", ".join(facet.NotationValue for facet in reference.NotationFacets)
+        return (None, _intern(code), None)
+    # IFC4 uses Identification, IFC2X3 ItemReference
+    code = getattr(reference, "Identification", None) or getattr(reference, "ItemReference", None)
+    source = getattr(reference, "ReferencedSource", None)
+    while source is not None and source.is_a("IfcClassificationReference"):
+        source = source.ReferencedSource
+    return (_intern(getattr(source, "Name", None)), _intern(code), _intern(reference.Name))
+
+
+class AssociationIndex:
+    """Materials and classifications per object, from one pass over the associations.
+
+    Each association is decoded once into a shared tuple for all the objects it
+    relates. Occurrences without their own association fall back to their type.
+    """
+
+    def __init__(self, ifc_file):
+        length_factor = get_unit_factors(ifc_file).get("LENGTHUNIT", 1.0)
+        self._materials = {}
+        self._classifications = {}
+        self._types = {}
+        for rel in ifc_file.by_type("IfcRelAssociatesMaterial"):
+            entries = _material_entries(rel.RelatingMaterial, length_factor) if rel.RelatingMaterial else ()
+            for related in rel.RelatedObjects:
+                existing = self._materials.get(related.id())
+                self._materials[related.id()] = entries if existing is None else existing + entries
+        for rel in ifc_file.by_type("IfcRelAssociatesClassification"):
+            entry = _classification_entry(rel.RelatingClassification)
+            for related in rel.RelatedObjects:
+                self._classifications.setdefault(related.id(), []).append(entry)
+        self._classifications = {key: tuple(entries) for key, entries in self._classifications.items()}
+        for rel in ifc_file.by_type("IfcRelDefinesByType"):
+            type_id = rel.RelatingType.id()
+            for related in rel.RelatedObjects:
+                self._types[related.id()] = type_id
+
+    def lookup(self, element):
+        """(materials, classifications) of an element, inheriting each from its type."""
+        key = element.id()
+        type_id = self._types.get(key)
+        materials = self._materials.get(key)
+        if materials is None:
+            materials = self._materials.get(type_id, ())
+        classifications = self._classifications.get(key)
+        if classifications is None:
+            classifications = self._classifications.get(type_id, ())
+        return materials, classifications
+
+
+_ASSOCIATION_INDEXES = weakref.WeakKeyDictionary()
+
+
+def get_association_index(ifc_file):
+    """Return the per-model material and classification index."""
+    with _MODEL_CACHE_LOCK:
+        index = _ASSOCIATION_INDEXES.get(ifc_file)
+    if index is None:
+        # Built outside the lock, which get_unit_factors() takes as well
+        index = AssociationIndex(ifc_file)
+        with _MODEL_CACHE_LOCK:
+            index = _ASSOCIATION_INDEXES.setdefault(ifc_file, index)
+    return index
+
+
+# ============================================================================
+# IFCXML READER
+# ============================================================================
+
+IFCXML_RELATIONS = {
+    "IfcRelContainedInSpatialStructure",
+    "IfcRelAggregates",
+    "IfcRelDefinesByProperties",
+    "IfcRelDefinesByType",
+}
+
+IFCXML_QUANTITY_ATTRIBUTES = {
+    "IfcQuantityLength": "LengthValue",
+    "IfcQuantityArea": "AreaValue",
+    "IfcQuantityVolume": "VolumeValue",
+    "IfcQuantityWeight": "WeightValue",
+    "IfcQuantityTime": "TimeValue",
+    "IfcQuantityCount": "CountValue",
+    "IfcQuantityNumber": "NumberValue",
+}
+
+IFCXML_NUMERIC_TYPES = ("Measure", "IfcReal", "IfcNumericMeasure", "IfcCountMeasure")
+IFCXML_INTEGER_TYPES = ("IfcInteger", "IfcCountMeasure")
+IFCXML_BOOLEAN_TYPES = ("IfcBoolean", "IfcLogical")
+IFCXML_SPATIAL_RELATIONSHIPS = ("IfcRelContainedInSpatialStructure", "IfcRelAggregates", "IfcRelNests")
+
+
+def _local_name(tag):
+    return tag.rpartition("}")[2]
+
+
+def _xml_attribute(elem, name):
+    """Read an attribute stored either as an XML attribute (IFC4) or child element (IFC2X3)."""
+    value = elem.get(name)
+    if value is not None:
+        return value
+    for child in elem:
+        if _local_name(child.tag) == name and len(child) == 0:
+            return child.text
+    return None
+
+
+def _xml_child(elem, name):
+    for child in elem:
+        if _local_name(child.tag) == name:
+            return child
+    return None
+
+
+def _xml_refs(elem, name):
+    """Return the ids referenced by an entity-valued attribute."""
+    attribute = _xml_child(elem, name)
+    if attribute is None:
+        return []
+    if attribute.get("ref"):
+        return [attribute.get("ref")]
+    return [child.get("ref") or child.get("id") for child in attribute
+            if child.get("ref") or child.get("id")]
+
+
+def _xml_value(elem):
+    """Decode a typed value wrapper such as <IfcBoolean-wrapper>true</...>."""
+    if elem is None:
+        return None
+    wrapper = elem if elem.text and elem.text.strip() else next(iter(elem), None)
+    if wrapper is None or wrapper.text is None:
+        return None
+    value_type = _local_name(wrapper.tag).replace("-wrapper", "")
+    text = wrapper.text.strip()
+    try:
+        if value_type.startswith(IFCXML_BOOLEAN_TYPES):
+            return {"true": True, "false": False}.get(text.lower(), text.upper())
+        if value_type.startswith(IFCXML_INTEGER_TYPES):
+            return int(text)
+        if value_type.endswith(IFCXML_NUMERIC_TYPES):
+            return float(text)
+    except ValueError:
+        pass
+    return text
+
+
+def _xml_enum(value):
+    return value.upper() if value else None
+
+
+def _xml_float(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class IfcXmlReader:
+    """Incremental ifcXML reader producing the same element records as the STEP path.
+
+    Top-level entities are processed as soon as their closing tag is parsed
+    and then cleared, so the DOM never holds more than one entity subtree.
+    Only the product, relationship, property and quantity content needed for
+    the element records is retained; geometry is discarded as it streams past.
+    After read(), schema holds the schema named by the root namespace. With
+    a Job, cancellation is checked every PROGRESS_CHUNK top-level entities
+    and the record building reports progress like extract_elements.
+
+    With counts_only, only products and the spatial relationships are kept;
+    parse() then summarize() count them without building any records.
+    """
+
+    def __init__(self, source, vocabulary=None, job=None, counts_only=False):
+        self.source = source
+        self.vocabulary = vocabulary or Vocabulary()
+        self.job = job
+        self.counts_only = counts_only
+        self.schema = "IFC4"
+        self._schema_decl = None
+        self._product_classes = {}
+        self.products = {}
+        self.containers = {}
+        self.parents = {}
+        self.definitions = defaultdict(list)
+        self.types = {}
+        self.type_psets = {}
+        self.psets = {}
+        self.properties = {}
+        self.qsets = {}
+        self.quantities = {}
+        self.project_units = None
+        self.unit_assignments = {}
+        self.named_units = {}
+        self.measures = {}
+        self.units = {}
+
+    def is_product(self, ifc_class):
+        cached = self._product_classes.get(ifc_class)
+        if cached is not None:
+            return cached
+        result = False
+        try:
+            if self._schema_decl is None:
+                self._schema_decl = ifcopenshell.ifcopenshell_wrapper.schema_by_name(self.schema)
+            decl = self._schema_decl.declaration_by_name(ifc_class)
+            while decl is not None:
+                if decl.name() == "IfcProduct":
+                    result = True
+                    break
+                decl = decl.supertype()
+        except (RuntimeError, AttributeError):
+            result = False
+        self._product_classes[ifc_class] = result
+        return result
+
+    def _detect_schema(self, root):
+        namespace = root.tag.partition("}")[0].upper()
+        if "IFC4X3" in namespace or "IFC4_3" in namespace:
+            self.schema = "IFC4X3"
+        elif "IFC2X3" in namespace:
+            self.schema = "IFC2X3"
+        else:
+            self.schema = "IFC4"
+
+    def read(self):
+        """Stream the file and return element records."""
+        self.parse()
+        return self.build_records()
+
+    def parse(self):
+        """Stream the file, keeping what the records or counts need."""
+        stack = []
+        entity_depth = None
+        visited = 0
+        for event, elem in ET.iterparse(self.source, events=("start", "end")):
+            if event == "start":
+                if not stack:
+                    self._detect_schema(elem)
+                elif entity_depth is None and _local_name(elem.tag).startswith("Ifc"):
+                    entity_depth = len(stack)
+                stack.append(elem)
+                continue
+            stack.pop()
+            if not stack:
+                continue
+            if len(stack) == entity_depth:
+                self._visit(elem)
+                entity_depth = None
+                stack[-1].clear()
+                visited += 1
+                if self.job and visited % PROGRESS_CHUNK == 0:
+                    self.job.check()
+            elif entity_depth is None and len(stack) == 1:
+                # Header and other non-entity blocks directly under the root
+                stack[-1].clear()
+
+    def _visit(self, top):
+        for elem in top.iter():
+            if elem.get("id") is None:
+                continue
+            ifc_class = _local_name(elem.tag)
+            if ifc_class.startswith("Ifc"):
+                self._handle(elem.get("id"), ifc_class, elem)
+
+    def _handle(self, entity_id, ifc_class, elem):
+        if self.counts_only and ifc_class not in IFCXML_SPATIAL_RELATIONSHIPS and not self.is_product(ifc_class):
+            return
+        if ifc_class == "IfcRelContainedInSpatialStructure":
+            structures = _xml_refs(elem, "RelatingStructure")
+            for related in _xml_refs(elem, "RelatedElements"):
+                self.containers[related] = structures[0] if structures else None
+        elif ifc_class in ("IfcRelAggregates", "IfcRelNests"):
+            parents = _xml_refs(elem, "RelatingObject")
+            for related in _xml_refs(elem, "RelatedObjects"):
+                self.parents[related] = parents[0] if parents else None
+        elif ifc_class == "IfcRelDefinesByProperties":
+            definitions = _xml_refs(elem, "RelatingPropertyDefinition")
+            for related in _xml_refs(elem, "RelatedObjects"):
+                self.definitions[related].extend(definitions)
+        elif ifc_class == "IfcRelDefinesByType":
+            types = _xml_refs(elem, "RelatingType")
+            for related in _xml_refs(elem, "RelatedObjects"):
+                self.types[related] = types[0] if types else None
+        elif ifc_class == "IfcPropertySet":
+            self.psets[entity_id] = (_xml_attribute(elem, "Name"), _xml_refs(elem, "HasProperties"))
+        elif ifc_class == "IfcPropertySingleValue":
+            self.properties[entity_id] = (
+                _xml_attribute(elem, "Name"), _xml_value(_xml_child(elem, "NominalValue")))
+        elif ifc_class == "IfcElementQuantity":
+            self.qsets[entity_id] = (_xml_attribute(elem, "Name"), _xml_refs(elem, "Quantities"))
+        elif ifc_class in IFCXML_QUANTITY_ATTRIBUTES:
+            value = _xml_float(_xml_attribute(elem, IFCXML_QUANTITY_ATTRIBUTES[ifc_class]))
+            self.quantities[entity_id] = (ifc_class, _xml_attribute(elem, "Name"), value)
+        elif ifc_class == "IfcProject":
+            assignments = _xml_refs(elem, "UnitsInContext")
+            self.project_units = assignments[0] if assignments else None
+        elif ifc_class == "IfcUnitAssignment":
+            self.unit_assignments[entity_id] = _xml_refs(elem, "Units")
+        elif ifc_class == "IfcSIUnit":
+            prefix = _xml_enum(_xml_attribute(elem, "Prefix"))
+            name = _xml_enum(_xml_attribute(elem, "Name"))
+            factor = SI_PREFIXES.get(prefix, 1.0) ** SI_UNIT_EXPONENTS.get(name, 1)
+            self.named_units[entity_id] = (
+                _xml_enum(_xml_attribute(elem, "UnitType")), factor * SI_UNIT_SCALES.get(name, 1.0), None)
+        elif ifc_class in ("IfcConversionBasedUnit", "IfcConversionBasedUnitWithOffset"):
+            measures = _xml_refs(elem, "ConversionFactor")
+            self.named_units[entity_id] = (
+                _xml_enum(_xml_attribute(elem, "UnitType")), 1.0, measures[0] if measures else None)
+        elif ifc_class == "IfcMeasureWithUnit":
+            units = _xml_refs(elem, "UnitComponent")
+            self.measures[entity_id] = (
+                _xml_float(_xml_value(_xml_child(elem, "ValueComponent"))), units[0] if units else None)
+        elif _xml_child(elem, "HasPropertySets") is not None:
+            self.type_psets[entity_id] = _xml_refs(elem, "HasPropertySets")
+        elif self.is_product(ifc_class):
+            self.products[entity_id] = {
+                "id": _xml_attribute(elem, "GlobalId") or "",
+                "name": _xml_attribute(elem, "Name"),
+                "class": ifc_class,
+                "predefinedType": _xml_enum(_xml_attribute(elem, "PredefinedType")),
+                "description": _xml_attribute(elem, "Description"),
+                "elevation": _xml_float(_xml_attribute(elem, "Elevation")),
+            }
+
+    def _pset_properties(self, pset_id):
+        _, prop_ids = self.psets[pset_id]
+        return {self.properties[p][0]: self.properties[p][1] for p in prop_ids if p in self.properties}
+
+    def _location(self, entity_id):
+        location = {"storey": None, "building": None, "site": None}
+        storey = self.products.get(self.containers.get(entity_id))
+        if storey and storey["class"] == "IfcBuildingStorey":
+            location["storey"] = {
+                "id": storey["id"],
+                "name": storey["name"],
+                "elevation": storey["elevation"],
+            }
+            building = self.products.get(self.parents.get(self.containers[entity_id]))
+            if building and building["class"] == "IfcBuilding":
+                location["building"] = {"id": building["id"], "name": building["name"]}
+        return location
+
+    def summarize(self, filters=None):
+        """Count the parsed products by class, storey and building, like summarize_elements."""
+        classes = filters.subtypes(self.schema) if filters else None
+        total = 0
+        by_class = {}
+        by_storey = {}
+        by_building = {}
+        for entity_id, product in self.products.items():
+            if classes is not None and product["class"] not in classes:
+                continue
+            location = self._location(entity_id)
+            if filters and not filters.storey_selected(location["storey"]):
+                continue
+            total += 1
+            by_class[product["class"]] = by_class.get(product["class"], 0) + 1
+            if location["storey"]:
+                storey_name = location["storey"]["name"]
+                by_storey[storey_name] = by_storey.get(storey_name, 0) + 1
+            if location["building"]:
+                building_name = location["building"]["name"]
+                by_building[building_name] = by_building.get(building_name, 0) + 1
+        return make_summary(total, by_class, by_storey, by_building)
+
+    def _unit_factor(self, unit_id, seen=()):
+        """SI factor of a named unit, following conversion-based units like UnitFactors."""
+        _, factor, measure = self.named_units.get(unit_id, (None, 1.0, None))
+        if measure is None:
+            return factor
+        value, component = self.measures.get(measure, (None, None))
+        if value is None:
+            return 1.0
+        if component in self.named_units and component not in seen:
+            return value * self._unit_factor(component, seen + (unit_id,))
+        return value
+
+    def resolve_units(self):
+        """Conversion factors of the project's unit assignment, keyed by unit type."""
+        units = self.unit_assignments.get(self.project_units)
+        if units is None and self.unit_assignments:
+            units = next(iter(self.unit_assignments.values()))
+        for unit_id in units or ():
+            unit_type = self.named_units.get(unit_id, (None,))[0]
+            if unit_type:
+                self.units[unit_type] = self._unit_factor(unit_id)
+        return self.units
+
+    def build_records(self):
+        self.resolve_units()
+        records = []
+        if self.job:
+            self.job.set_total(len(self.products))
+        for entity_id, product in self.products.items():
+            details = {key: value for key, value in product.items() if key != "elevation"}
+            details.update(self._location(entity_id))
+
+            properties = {}
+            sources = {}
+            type_id = self.types.get(entity_id)
+            for pset_id in self.type_psets.get(type_id, ()):
+                if pset_id in self.psets:
+                    pset_name = self.psets[pset_id][0]
+                    properties.setdefault(pset_name, {}).update(self._pset_properties(pset_id))
+                    sources[pset_name] = "type"
+            quantities = {}
+            for definition in self.definitions.get(entity_id, ()):
+                if definition in self.psets:
+                    pset_name = self.psets[definition][0]
+                    properties.setdefault(pset_name, {}).update(self._pset_properties(definition))
+                    sources[pset_name] = "both" if sources.get(pset_name) == "type" else "occurrence"
+                elif definition in self.qsets:
+                    qto_name, quantity_ids = self.qsets[definition]
+                    for quantity_id in quantity_ids:
+                        if quantity_id not in self.quantities:
+                            continue
+                        ifc_class, name, value = self.quantities[quantity_id]
+                        if value is None:
+                            continue
+                        _, unit_type, unit = QUANTITY_TYPES[ifc_class]
+                        if unit_type is not None:
+                            value *= self.units.get(unit_type, 1.0)
+                        quantities[name] = {
+                            "value": value,
+                            "unit": unit,
+                            "quantitySet": qto_name or "Quantities"
+                        }
+            details["properties"] = {name: props for name, props in properties.items() if props}
+            details["propertySources"] = {name: sources[name] for name in details["properties"]}
+            details["quantities"] = quantities
+            records.append(ElementRecord.from_dict(self.vocabulary, details))
+            if self.job and len(records) % PROGRESS_CHUNK == 0:
+                self.job.advance(PROGRESS_CHUNK)
+        if self.job:
+            self.job.advance(len(records) % PROGRESS_CHUNK)
+        return records
+
+
+# ============================================================================
+# INSTRUMENTATION
+# ============================================================================
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    """Base class for a labelled Prometheus metric."""
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._expose_sample(key, value))
+        return lines
+
+    def _expose_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed buckets."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def _expose_sample(self, key, state):
+        lines = []
+        for bound, count in zip(self.buckets, state["counts"]):
+            labels = _format_labels(self.labelnames, key, ("le", repr(float(bound))))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+        labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+        lines.append(f"{self.name}_bucket{labels} {state['count']}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {state['sum']}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """Register a callable run before every scrape to refresh gauges."""
+        self._collectors.append(collector)
+
+    def expose(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+REQUEST_DURATION = METRICS.histogram(
+    "ifc_request_duration_seconds", "Total request handling time.", ("endpoint", "status"))
+STAGE_DURATION = METRICS.histogram(
+    "ifc_stage_duration_seconds", "Time spent in each processing stage.", ("endpoint", "stage"))
+REQUESTS_IN_FLIGHT = METRICS.gauge(
+    "ifc_requests_in_flight", "Requests currently being processed.", ("endpoint",))
+CACHE_REQUESTS = METRICS.counter(
+    "ifc_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+CACHE_ENTRIES = METRICS.gauge(
+    "ifc_cache_entries", "Entries currently held in each cache.", ("cache",))
+
+METRICS.add_collector(lambda: CACHE_ENTRIES.set(len(PROCESSED_FILES), cache="processed_files"))
+
+
+class StageTimer:
+    """Record how long each named stage of a request takes."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = []
+        self.fields = {}
+        self.job = None
+
+    @contextmanager
+    def stage(self, name):
+        if self.job is not None:
+            self.job.set_stage(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.stages.append((name, duration))
+            STAGE_DURATION.observe(duration, endpoint=self.endpoint, stage=name)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Render the stages as a Server-Timing header value."""
+        entries = [f"{name};dur={duration * 1000:.1f}" for name, duration in self.stages]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+    def log(self, status):
+        record = {
+            "event": "request_timing",
+            "endpoint": self.endpoint,
+            "status": status,
+            "totalMs": round(self.elapsed() * 1000, 1),
+            "stages": {name: round(duration * 1000, 1) for name, duration in self.stages},
+        }
+        record.update(self.fields)
+        logger.info(json.dumps(record, default=str))
+
+
+def current_timer():
+    """Return the StageTimer of the running request, or a throwaway one."""
+    return g.get("timer") or StageTimer("unknown")
+
+
+def instrumented(endpoint):
+    """Time a view, expose its stages as Server-Timing and record metrics."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            timer = StageTimer(endpoint)
+            g.timer = timer
+            REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+            status = 500
+            try:
+                response = app.make_response(view(*args, **kwargs))
+                status = response.status_code
+                response.headers["Server-Timing"] = timer.server_timing()
+                return response
+            finally:
+                if timer.job is not None:
+                    timer.job.finish(None if status < 400 else f"HTTP {status}")
+                REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+                REQUEST_DURATION.observe(timer.elapsed(), endpoint=endpoint, status=status)
+                timer.log(status)
+        return wrapper
+    return decorator
+
+
+# ============================================================================
+# CACHES
+# ============================================================================
+
+class LRUCache:
+    """Thread-safe LRU cache that reports hits and misses to /metrics.
+
+    With weigh, each entry's estimated size in bytes is tracked in nbytes so
+    that admission control can count it and evict entries when jobs need room.
+    """
+
+    def __init__(self, name, maxsize, weigh=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.weigh = weigh
+        self.nbytes = 0
+        self.admission = None
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        METRICS.add_collector(lambda: CACHE_ENTRIES.set(len(self._data), cache=self.name))
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+        CACHE_REQUESTS.inc(cache=self.name, result="hit" if value is not None else "miss")
+        return value
+
+    def put(self, key, value):
+        size = self.weigh(value) if self.weigh else 0
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self.nbytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            while len(self._data) > self.maxsize:
+                self._pop_oldest()
+        if self.admission is not None:
+            self.admission.trim()
+
+    def _pop_oldest(self):
+        key, _ = self._data.popitem(last=False)
+        size = self._sizes.pop(key)
+        self.nbytes -= size
+        return size
+
+    def evict(self, nbytes):
+        """Drop least recently used entries until nbytes are freed; returns the bytes freed."""
+        freed = 0
+        with self._lock:
+            while self._data and freed < nbytes:
+                freed += self._pop_oldest()
+        return freed
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ============================================================================
+# ADMISSION CONTROL
+# ============================================================================
+
+# Initial estimate of resident memory per byte of model file, refined per
+# schema from the peak RSS observed on completed jobs.
+SCHEMA_MEMORY_FACTORS = {"IFC2X3": 8.0, "IFC4": 10.0, "IFC4X3": 12.0, "IFCXML": 2.0}
+DEFAULT_MEMORY_FACTOR = 10.0
+JOB_BASE_MEMORY = 64 * 1024 * 1024
+# Smaller files are dominated by fixed overhead and would skew the factors
+MIN_LEARNING_FILE_SIZE = 8 * 1024 * 1024
+
+ADMISSION_RESERVED = METRICS.gauge(
+    "ifc_admission_reserved_bytes", "Memory reserved by admitted jobs.")
+ADMISSION_QUEUED = METRICS.gauge(
+    "ifc_admission_queued_jobs", "Jobs waiting for memory budget.")
+ADMISSION_CACHED = METRICS.gauge(
+    "ifc_admission_cached_bytes", "Estimated memory held by cached models, counted against the budget.")
+ADMISSION_REJECTED = METRICS.counter(
+    "ifc_admission_rejected_total", "Jobs rejected by admission control.", ("reason",))
+JOB_PEAK_RSS = METRICS.histogram(
+    "ifc_job_peak_rss_bytes", "Peak resident memory growth per job.", ("schema",),
+    buckets=tuple(2 ** i * 1024 * 1024 for i in range(4, 16)))
+PROCESS_RSS = METRICS.gauge(
+    "process_resident_memory_bytes", "Resident memory size in bytes.")
+
+
+def current_rss():
+    """Return the resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is the lifetime peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+METRICS.add_collector(lambda: PROCESS_RSS.set(current_rss()))
+
+
+def detect_schema(stream):
+    """Read the schema identifier from the header of a STEP stream."""
+    try:
+        head = stream.read(64 * 1024).decode("latin-1")
+    except OSError:
+        return None
+    match = re.search(r"FILE_SCHEMA\s*\(\s*\(\s*'([A-Za-z0-9_]+)'", head)
+    return match.group(1).upper() if match else None
+
+
+class RssSampler:
+    """Poll process RSS in the background and keep the peak."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.baseline = current_rss()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        return self.peak - self.baseline
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot be admitted within the memory budget."""
+
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """Memory reservation held by an admitted job."""
+
+    def __init__(self, size, schema, estimate):
+        self.size = size
+        self.schema = schema
+        self.estimate = estimate
+        self.started = time.perf_counter()
+        self.solo = True
+        self.sampler = RssSampler().start()
+
+
+class AdmissionController:
+    """Admit model loads only while their estimated memory fits the budget."""
+
+    def __init__(self, budget, max_queued, queue_timeout):
+        self.budget = budget
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.factors = dict(SCHEMA_MEMORY_FACTORS)
+        self.reserved = 0
+        self.queued = 0
+        self.active = []
+        self.avg_duration = 5.0
+        self.caches = []
+        self._cond = threading.Condition()
+
+    def register_cache(self, cache):
+        """Charge a weighed cache's entries to the budget, evicting them when jobs need room."""
+        cache.admission = self
+        self.caches.append(cache)
+
+    def _make_room(self, estimate):
+        # Caller holds _cond; cached models give way to admitted jobs
+        excess = self.reserved + estimate + sum(cache.nbytes for cache in self.caches) - self.budget
+        for cache in self.caches:
+            if excess <= 0:
+                break
+            excess -= cache.evict(excess)
+        ADMISSION_CACHED.set(sum(cache.nbytes for cache in self.caches))
+
+    def trim(self):
+        """Evict cached entries that no longer fit next to the reserved jobs."""
+        with self._cond:
+            self._make_room(0)
+
+    def estimate(self, size, schema):
+        factor = self.factors.get(schema, DEFAULT_MEMORY_FACTOR)
+        return int(size * factor) + JOB_BASE_MEMORY
+
+    def retry_after(self):
+        return max(1, int(round(self.avg_duration)))
+
+    def acquire(self, size, schema):
+        """Reserve memory for a job, waiting in the queue if necessary."""
+        estimate = self.estimate(size, schema)
+        if estimate > self.budget:
+            ADMISSION_REJECTED.inc(reason="too_large")
+            raise AdmissionRejected(
+                f"Model needs an estimated {estimate // 2 ** 20} MB, "
+                f"more than the {self.budget // 2 ** 20} MB memory budget", 503)
+        with self._cond:
+            if self.reserved + estimate > self.budget:
+                if self.queued >= self.max_queued:
+                    ADMISSION_REJECTED.inc(reason="queue_full")
+                    raise AdmissionRejected("Server busy, too many queued jobs", 429, self.retry_after())
+                self.queued += 1
+                ADMISSION_QUEUED.set(self.queued)
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self.reserved + estimate <= self.budget, self.queue_timeout)
+                finally:
+                    self.queued -= 1
+                    ADMISSION_QUEUED.set(self.queued)
+                if not admitted:
+                    ADMISSION_REJECTED.inc(reason="timeout")
+                    raise AdmissionRejected("Server busy, memory budget exhausted", 503, self.retry_after())
+            self._make_room(estimate)
+            self.reserved += estimate
+            ADMISSION_RESERVED.set(self.reserved)
+            for other in self.active:
+                other.solo = False
+            ticket = AdmissionTicket(size, schema, estimate)
+            ticket.solo = not self.active
+            self.active.append(ticket)
+            return ticket
+
+    def release(self, ticket):
+        """Return a job's reservation and learn from its observed peak RSS."""
+        growth = ticket.sampler.stop()
+        duration = time.perf_counter() - ticket.started
+        with self._cond:
+            self.active.remove(ticket)
+            self.reserved -= ticket.estimate
+            ADMISSION_RESERVED.set(self.reserved)
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+            # Only jobs that ran alone give a clean reading of their own peak
+            if ticket.solo and ticket.size >= MIN_LEARNING_FILE_SIZE and growth > 0:
+                observed = min(max(1.0, (growth - JOB_BASE_MEMORY) / ticket.size), 50.0)
+                key = ticket.schema or "unknown"
+                previous = self.factors.get(key, DEFAULT_MEMORY_FACTOR)
+                self.factors[key] = 0.7 * previous + 0.3 * observed
+            self._cond.notify_all()
+        JOB_PEAK_RSS.observe(max(growth, 0), schema=ticket.schema or "unknown")
+        logger.info(json.dumps({
+            "event": "job_memory",
+            "schema": ticket.schema,
+            "fileSize": ticket.size,
+            "estimatedBytes": ticket.estimate,
+            "peakRssGrowthBytes": growth,
+            "solo": ticket.solo,
+        }))
+
+
+ADMISSION = AdmissionController(
+    app.config['MEMORY_BUDGET'],
+    app.config['ADMISSION_MAX_QUEUED'],
+    app.config['ADMISSION_QUEUE_TIMEOUT'],
+)
+
+
+def admission_error(error):
+    """Build the 429/503 response for a rejected job."""
+    response = jsonify({"success": False, "error": str(error)})
+    response.status_code = error.status
+    if error.retry_after is not None:
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+# ============================================================================
+# JOB PROGRESS
+# ============================================================================
+
+PROGRESS_CHUNK = 256          # elements processed between progress updates
+PROGRESS_INTERVAL = 0.25      # minimum seconds between events on one stream
+PROGRESS_HEARTBEAT = 15       # keep-alive comment when nothing changes
+JOB_RETENTION = 300           # seconds a finished job stays queryable after its last update
+
+JOB_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled or ran out of time."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    """Progress of one analysis or validation, readable from other requests."""
+
+    def __init__(self, job_id, parent=None):
+        self.id = job_id
+        self.parent = parent
+        self.status = "pending"
+        self.stage = None
+        self.unit = None
+        self.processed = 0
+        self.total = None
+        self.error = None
+        self.started = time.monotonic()
+        self.updated = self.started
+        self.deadline = None
+        self.cancelled = None
+        self._subscribers = 0
+        self._abandoned_at = None
+        self._stage_started = self.started
+        self._version = 0
+        self._cond = threading.Condition()
+
+    def _changed(self):
+        self.updated = time.monotonic()
+        self._version += 1
+        self._cond.notify_all()
+
+    def check(self):
+        """Raise JobCancelled if the job was cancelled, abandoned or is past its deadline."""
+        if self.parent is not None:
+            self.parent.check()
+        if self.cancelled is None:
+            now = time.monotonic()
+            if self.deadline is not None and now > self.deadline:
+                limit = app.config['JOB_TIME_LIMIT']
+                self.cancel(f"Job exceeded the time limit of {limit:g} s", 504)
+            elif (self._abandoned_at is not None
+                  and now - self._abandoned_at > app.config['JOB_DISCONNECT_GRACE']):
+                self.cancel("Client disconnected")
+        if self.cancelled is not None:
+            raise JobCancelled(*self.cancelled)
+
+    def cancel(self, reason="Cancelled by client", status=409):
+        with self._cond:
+            if self.cancelled is None and not self.finished:
+                self.cancelled = (reason, status)
+                self._changed()
+
+    def subscribe(self):
+        with self._cond:
+            self._subscribers += 1
+            self._abandoned_at = None
+
+    def unsubscribe(self, disconnected=True):
+        """Start the disconnect grace period once the last progress stream closes."""
+        with self._cond:
+            self._subscribers -= 1
+            if disconnected and self._subscribers == 0 and not self.finished:
+                self._abandoned_at = time.monotonic()
+
+    def touch(self):
+        """Mark the job as alive without reporting a change."""
+        with self._cond:
+            self.updated = time.monotonic()
+
+    def set_stage(self, stage):
+        self.check()
+        with self._cond:
+            if self.status == "pending":
+                self.status = "running"
+            self.stage = stage
+            self.unit = None
+            self.processed = 0
+            self.total = None
+            self._stage_started = time.monotonic()
+            self._changed()
+
+    def set_total(self, total, unit="elements"):
+        with self._cond:
+            self.total = total
+            self.unit = unit
+            self._changed()
+
+    def advance(self, count=1):
+        with self._cond:
+            self.processed += count
+            self._changed()
+        self.check()
+
+    def finish(self, error=None):
+        with self._cond:
+            if self.cancelled is not None:
+                self.status, self.error = "cancelled", self.cancelled[0]
+            else:
+                self.status = "error" if error else "done"
+                self.error = error
+            self._changed()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error", "cancelled")
+
+    def expired(self, cutoff):
+        """Whether the registry may forget this job, given the oldest update to keep."""
+        with self._cond:
+            idle = self.finished or (self.status == "pending" and self._subscribers == 0)
+            return idle and self.updated < cutoff
+
+    def wait(self, version, timeout):
+        """Block until the job changes past `version`; return the new version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    def snapshot(self):
+        with self._cond:
+            now = time.monotonic()
+            eta = None
+            if self.total and 0 < self.processed < self.total:
+                rate = self.processed / max(now - self._stage_started, 1e-6)
+                eta = round((self.total - self.processed) / rate, 1)
+            return {
+                "jobId": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "unit": self.unit,
+                "processed": self.processed,
+                "total": self.total,
+                "elapsed": round(now - self.started, 1),
+                "eta": eta,
+                "error": self.error,
+                "cancelRequested": self.cancelled is not None,
+            }
+
+
+class JobRegistry:
+    """Jobs by id; the progress stream may subscribe before the upload arrives."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        # Running jobs stay registered however long a stage is silent; only
+        # finished jobs, and ids nobody started or listens to, expire
+        cutoff = time.monotonic() - JOB_RETENTION
+        for job_id in [k for k, job in self._jobs.items() if job.expired(cutoff)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_or_create(self, job_id=None):
+        with self._lock:
+            self._prune()
+            job_id = job_id or uuid.uuid4().hex
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._jobs[job_id] = Job(job_id)
+            return job
+
+
+JOBS = JobRegistry()
+
+
+def start_job(job_id):
+    """Register the job of the running request and attach it to its timer."""
+    if job_id and not JOB_ID_RE.match(job_id):
+        raise ValueError("Invalid jobId")
+    job = JOBS.get_or_create(job_id)
+    if app.config['JOB_TIME_LIMIT'] > 0:
+        job.deadline = time.monotonic() + app.config['JOB_TIME_LIMIT']
+    current_timer().job = job
+    return job
+
+
+def extract_elements(ifc_file, elements, job, vocabulary=None, psets=None):
+    """Extract element records in chunks, reporting progress between chunks."""
+    vocabulary = vocabulary or Vocabulary()
+    job.set_total(len(elements))
+    records = []
+    for start in range(0, len(elements), PROGRESS_CHUNK):
+        chunk = elements[start:start + PROGRESS_CHUNK]
+        records.extend(get_element_details(ifc_file, element, vocabulary, psets) for element in chunk)
+        job.advance(len(chunk))
+    return records
+
+
+def progress_events(job):
+    """Yield Server-Sent Events for a job, at most one per PROGRESS_INTERVAL.
+
+    Closing the stream counts as a disconnect: if no other stream is open,
+    the job is cancelled after JOB_DISCONNECT_GRACE seconds.
+    """
+    job.subscribe()
+    disconnected = True
+    try:
+        version = -1
+        while True:
+            new_version = job.wait(version, PROGRESS_HEARTBEAT)
+            if new_version == version:
+                if JOBS.get(job.id) is not job:
+                    # The registry let go of the job, the client did not
+                    disconnected = False
+                    return
+                job.touch()
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            snapshot = job.snapshot()
+            yield f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+            if job.finished:
+                return
+            time.sleep(PROGRESS_INTERVAL)
+    finally:
+        job.unsubscribe(disconnected)
+
+
+# ============================================================================
+# GEOMETRY QUANTITIES
+# ============================================================================
+
+GEOMETRY_CACHE = LRUCache("geometry", app.config['GEOMETRY_CACHE_SIZE'],
+                          lambda results: len(results) * GEOMETRY_ENTRY_BYTES)
+ADMISSION.register_cache(GEOMETRY_CACHE)
+GEOMETRY_QTO_NAME = "Qto_Geometry"
+GEOMETRY_ENTRY_BYTES = 1024    # estimated size of one element's cached measurements
+
+
+def compute_geometry_quantities(ifc_file, job=None, include=None):
+    """Tessellate every product on ifcopenshell's multi-threaded iterator and measure it.
+
+    Returns {GlobalId: {"volume", "surfaceArea", "footprintArea", "bbox"}} in
+    metres, as the iterator emits world coordinates in SI units. With include,
+    only those products are tessellated.
+    """
+    import ifcopenshell.geom
+    import ifcopenshell.util.shape as shape_util
+    
+    if include is not None and not include:
+        return {}
+    settings = ifcopenshell.geom.settings()
+    settings.set("use-world-coords", True)
+    iterator = ifcopenshell.geom.iterator(settings, ifc_file, app.config['GEOMETRY_THREADS'], include=include)
+    
+    results = {}
+    if not iterator.initialize():
+        return results
+    if job:
+        job.set_total(None, "shapes")
+    while True:
+        shape = iterator.get()
+        geometry = shape.geometry
+        bbox_min, bbox_max = shape_util.get_bbox(shape_util.get_vertices(geometry))
+        try:
+            footprint = shape_util.get_footprint_area(geometry)
+        except Exception:
+            footprint = None
+        results[shape.guid] = {
+            "volume": float(shape_util.get_volume(geometry)),
+            "surfaceArea": float(shape_util.get_area(geometry)),
+            "footprintArea": float(footprint) if footprint is not None else None,
+            "bbox": {"min": [float(v) for v in bbox_min], "max": [float(v) for v in bbox_max]},
+        }
+        if job and len(results) % PROGRESS_CHUNK == 0:
+            job.advance(PROGRESS_CHUNK)
+        if not iterator.next():
+            break
+    if job:
+        job.advance(len(results) % PROGRESS_CHUNK)
+    return results
+
+
+def get_geometry_quantities(ifc_file, model_hash, job=None, include=None):
+    """Return geometry quantities for a model revision, computing them once.
+
+    model_hash must identify the include selection as well as the file.
+    """
+    results = GEOMETRY_CACHE.get(model_hash)
+    if results is None:
+        results = compute_geometry_quantities(ifc_file, job, include)
+        GEOMETRY_CACHE.put(model_hash, results)
+    return results
+
+
+def apply_geometry_quantities(records, geometry, vocabulary):
+    """Attach geometry measurements to element records.
+
+    Measured values go into a separate Qto_Geometry set. NetVolume is only
+    filled in when the model did not provide one.
+    """
+    for record in records:
+        measured = geometry.get(record.id)
+        if measured is None:
+            continue
+        record.set_geometry(measured)
+        quantities = record.quantities()
+        derived = {
+            "SurfaceArea": (measured["surfaceArea"], "m²"),
+            "FootprintArea": (measured["footprintArea"], "m²"),
+        }
+        if "NetVolume" not in quantities:
+            derived["NetVolume"] = (measured["volume"], "m³")
+        for name, (value, unit) in derived.items():
+            if value is not None and name not in quantities:
+                quantities[name] = {"value": value, "unit": unit, "quantitySet": GEOMETRY_QTO_NAME}
+        record.set_quantities(vocabulary, quantities)
+
+
+# ============================================================================
+# SPATIAL INDEX
+# ============================================================================
+
+class RTree:
+    """Static 3D R-tree bulk-loaded with Sort-Tile-Recursive packing.
+
+    Every level is stored as NumPy arrays (box bounds plus the range of
+    children in the level below), so queries test whole levels at once
+    instead of walking nodes one by one in Python.
+    """
+
+    def __init__(self, mins, maxs, node_size=16):
+        self.mins = np.asarray(mins, dtype=np.float64).reshape(-1, 3)
+        self.maxs = np.asarray(maxs, dtype=np.float64).reshape(-1, 3)
+        self.node_size = node_size
+        self.levels = []
+        if len(self.mins):
+            self._build()
+
+    def _str_order(self, mins, maxs):
+        """Order boxes into STR tiles: slices along x, then runs along y."""
+        centers = (mins + maxs) / 2
+        count = len(centers)
+        node_count = -(-count // self.node_size)
+        slice_count = max(1, int(np.ceil(np.sqrt(node_count))))
+        slice_size = slice_count * self.node_size
+        by_x = np.argsort(centers[:, 0], kind="stable")
+        order = np.empty_like(by_x)
+        for start in range(0, count, slice_size):
+            chunk = by_x[start:start + slice_size]
+            order[start:start + len(chunk)] = chunk[np.argsort(centers[chunk, 1], kind="stable")]
+        return order
+
+    def _build(self):
+        # Leaf level: entries are the indexed items themselves
+        order = self._str_order(self.mins, self.maxs)
+        entry_mins, entry_maxs = self.mins[order], self.maxs[order]
+        self.leaf_items = order
+        while True:
+            starts = np.arange(0, len(entry_mins), self.node_size)
+            node_mins = np.minimum.reduceat(entry_mins, starts, axis=0)
+            node_maxs = np.maximum.reduceat(entry_maxs, starts, axis=0)
+            counts = np.diff(np.append(starts, len(entry_mins)))
+            level = {"mins": node_mins, "maxs": node_maxs, "start": starts, "count": counts}
+            if len(node_mins) == 1:
+                self.levels.append(level)
+                break
+            # Re-tile this level so parents cover contiguous runs of children
+            order = self._str_order(node_mins, node_maxs)
+            for key in level:
+                level[key] = level[key][order]
+            self.levels.append(level)
+            entry_mins, entry_maxs = level["mins"], level["maxs"]
+        self.levels.reverse()
+
+    @staticmethod
+    def _expand(starts, counts):
+        """Concatenate arange(start, start + count) for every candidate."""
+        if len(counts) == 0:
+            return np.empty(0, dtype=np.int64)
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return offsets + np.arange(counts.sum())
+
+    def query(self, box_min, box_max):
+        """Return item indices whose boxes intersect the query box."""
+        if not self.levels:
+            return np.empty(0, dtype=np.int64)
+        box_min = np.asarray(box_min, dtype=np.float64)
+        box_max = np.asarray(box_max, dtype=np.float64)
+        candidates = np.zeros(1, dtype=np.int64)
+        for depth, level in enumerate(self.levels):
+            hit = np.all((level["mins"][candidates] <= box_max) & (level["maxs"][candidates] >= box_min), axis=1)
+            candidates = candidates[hit]
+            children = self._expand(level["start"][candidates], level["count"][candidates])
+            if depth == len(self.levels) - 1:
+                items = self.leaf_items[children]
+                hit = np.all((self.mins[items] <= box_max) & (self.maxs[items] >= box_min), axis=1)
+                return items[hit]
+            candidates = children
+        return np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def _box_distance(mins, maxs, point):
+        delta = np.maximum(np.maximum(mins - point, point - maxs), 0)
+        return np.sqrt((delta * delta).sum(axis=-1))
+
+    def nearest(self, point, k=10, exclude=None):
+        """Return [(item, distance)] of the k boxes nearest to a point (best-first search)."""
+        import heapq
+        if not self.levels:
+            return []
+        point = np.asarray(point, dtype=np.float64)
+        leaf_depth = len(self.levels) - 1
+        heap = [(0.0, 0, 0, False)]  # (distance, depth, node or item, is_item)
+        results = []
+        while heap and len(results) < k:
+            distance, depth, index, is_item = heapq.heappop(heap)
+            if is_item:
+                if index != exclude:
+                    results.append((int(index), float(distance)))
+                continue
+            level = self.levels[depth]
+            children = np.arange(level["start"][index], level["start"][index] + level["count"][index])
+            if depth == leaf_depth:
+                items = self.leaf_items[children]
+                for item, d in zip(items, self._box_distance(self.mins[items], self.maxs[items], point)):
+                    heapq.heappush(heap, (float(d), depth, int(item), True))
+            else:
+                below = self.levels[depth + 1]
+                distances = self._box_distance(below["mins"][children], below["maxs"][children], point)
+                for child, d in zip(children, distances):
+                    heapq.heappush(heap, (float(d), depth + 1, int(child), False))
+        return results
+
+
+def placement_origins(ifc_file, elements):
+    """Return the world origin (in metres) of each element's ObjectPlacement.
+
+    Placement matrices are memoized per IfcLocalPlacement, so elements that
+    share a storey or parent placement reuse the already computed chain.
+    """
+    import ifcopenshell.util.placement as placement_util
+    
+    scale = get_unit_factors(ifc_file).get("LENGTHUNIT", 1.0)
+    matrices = {}
+    
+    def matrix(placement):
+        key = placement.id()
+        result = matrices.get(key)
+        if result is None:
+            if placement.is_a("IfcLocalPlacement") and placement.RelativePlacement is not None:
+                result = placement_util.get_axis2placement(placement.RelativePlacement)
+                if placement.PlacementRelTo is not None:
+                    result = matrix(placement.PlacementRelTo) @ result
+            else:
+                result = placement_util.get_local_placement(placement)
+            matrices[key] = result
+        return result
+    
+    parents = {}
+    
+    def parent_transform(placement):
+        # Plain-Python rows are cheaper than NumPy for one 3x3 product per element
+        key = placement.id()
+        result = parents.get(key)
+        if result is None:
+            result = parents[key] = matrix(placement)[:3].tolist()
+        return result
+    
+    origins = []
+    for element in elements:
+        placement = getattr(element, "ObjectPlacement", None)
+        if placement is None:
+            origins.append(None)
+            continue
+        try:
+            # Only the parent chain needs full matrices; the element itself
+            # contributes just its local origin
+            relative = placement.RelativePlacement if placement.is_a("IfcLocalPlacement") else None
+            location = relative.Location if relative is not None else None
+            if location is not None and location.is_a("IfcCartesianPoint"):
+                x, y, z = (tuple(location.Coordinates) + (0.0, 0.0))[:3]
+                parent = placement.PlacementRelTo
+                if parent is not None:
+                    rows = parent_transform(parent)
+                    x, y, z = (r[0] * x + r[1] * y + r[2] * z + r[3] for r in rows)
+                origins.append((x * scale, y * scale, z * scale))
+            else:
+                origins.append(tuple(matrix(placement)[:3, 3] * scale))
+        except Exception:
+            origins.append(None)
+    return origins
+
+
+def build_spatial_index(records, origins=None):
+    """Build an R-tree over element bounding boxes.
+
+    Geometry bounding boxes are used when the geometry pass ran; otherwise
+    each element is indexed as a point at its placement origin.
+    """
+    positions, mins, maxs = [], [], []
+    for i, record in enumerate(records):
+        bbox = record.bbox()
+        if bbox:
+            box_min, box_max = bbox
+        elif origins is not None and origins[i] is not None:
+            box_min = box_max = origins[i]
+        else:
+            continue
+        positions.append(i)
+        mins.append(box_min)
+        maxs.append(box_max)
+    tree = RTree(mins, maxs)
+    return tree, np.asarray(positions, dtype=np.int64)
+
+
+# ============================================================================
+# SEARCH INDEX
+# ============================================================================
+
+# Field name used in queries -> ranking weight
+SEARCH_FIELD_WEIGHTS = {
+    "name": 3.0,
+    "class": 2.0,
+    "type": 1.5,
+    "pset": 1.0,
+    "description": 1.0,
+    "value": 1.0,
+}
+SEARCH_MAX_PREFIX_EXPANSION = 1024
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_CAMEL_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_CAMEL_BOUNDARY_RE = re.compile(r"[a-z][A-Z]")
+
+
+def search_tokens(text):
+    """Index tokens: lower-cased words plus their underscore and camel-case parts.
+
+    'Pset_WallCommon' yields pset_wallcommon, pset, wallcommon, wall and common,
+    so a query for any of the parts finds it.
+    """
+    tokens = set()
+    for word in _WORD_RE.findall(text):
+        tokens.add(word.lower())
+        for part in word.split("_"):
+            tokens.add(part.lower())
+            if _CAMEL_BOUNDARY_RE.search(part):
+                tokens.update(p.lower() for p in _CAMEL_RE.findall(part))
+    tokens.discard("")
+    return tokens
+
+
+class SearchIndex:
+    """Inverted index from (field, token) to element positions."""
+
+    def __init__(self):
+        self.size = 0
+        self._postings = defaultdict(lambda: array("I"))
+        self._tokens = {}
+
+    def add(self, position, record):
+        fields = {
+            "name": record.name,
+            "description": record.description,
+            "class": record.ifc_class,
+            "type": record.predefined_type,
+        }
+        seen = set()
+        for field, text in fields.items():
+            if isinstance(text, str):
+                seen.update((field, token) for token in search_tokens(text))
+        for pset_name, _, _ in record.pset_layout:
+            seen.update(("pset", token) for token in search_tokens(pset_name))
+        for value in record.pset_values:
+            if isinstance(value, str):
+                seen.update(("value", token) for token in search_tokens(value))
+        for key in seen:
+            self._postings[key].append(position)
+        self.size = max(self.size, position + 1)
+
+    def finalize(self):
+        """Freeze postings into NumPy arrays and sort tokens for prefix lookups."""
+        by_field = defaultdict(list)
+        postings = {}
+        for (field, token), positions in self._postings.items():
+            postings[(field, token)] = np.frombuffer(positions, dtype=np.uint32)
+            by_field[field].append(token)
+        self._postings = postings
+        self._tokens = {field: sorted(tokens) for field, tokens in by_field.items()}
+        return self
+
+    def _expand(self, field, token, prefix):
+        tokens = self._tokens.get(field, [])
+        if not prefix:
+            return [token] if (field, token) in self._postings else []
+        start = bisect.bisect_left(tokens, token)
+        matches = []
+        for candidate in tokens[start:start + SEARCH_MAX_PREFIX_EXPANSION]:
+            if not candidate.startswith(token):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, query, limit=50):
+        """Run a query and return (ranked [(position, score)], total matches).
+
+        Terms are ANDed. 'term*' matches by prefix and 'field:term' restricts a
+        term to name, description, class, type, pset or value. Each term scores
+        the best field weight times the token's inverse document frequency.
+        """
+        terms = []
+        for term in query.split():
+            field, _, text = term.rpartition(":")
+            field = field.lower()
+            if field and field not in SEARCH_FIELD_WEIGHTS:
+                raise ValueError(f"Unknown search field '{field}'")
+            words = _WORD_RE.findall(text.lower())
+            for i, word in enumerate(words):
+                # A trailing '*' only applies to the last word of the term
+                prefix = text.endswith("*") and i == len(words) - 1
+                terms.append(([field] if field else list(SEARCH_FIELD_WEIGHTS), word, prefix))
+        if not terms or self.size == 0:
+            return [], 0
+        total = np.zeros(self.size, dtype=np.float32)
+        matched = np.ones(self.size, dtype=bool)
+        for fields, word, prefix in terms:
+            term_scores = np.zeros(self.size, dtype=np.float32)
+            for name in fields:
+                for candidate in self._expand(name, word, prefix):
+                    positions = self._postings[(name, candidate)]
+                    idf = math.log(1 + self.size / len(positions))
+                    weight = SEARCH_FIELD_WEIGHTS[name] * idf
+                    term_scores[positions] = np.maximum(term_scores[positions], weight)
+            matched &= term_scores > 0
+            total += term_scores
+        hits = np.nonzero(matched)[0]
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-total[hits], limit)[:limit]]
+        hits = hits[np.argsort(-total[hits], kind="stable")]
+        return [(int(p), float(total[p])) for p in hits], int(matched.sum())
+
+
+def build_search_index(records):
+    index = SearchIndex()
+    for position, record in enumerate(records):
+        index.add(position, record)
+    return index.finalize()
+
+
+# ============================================================================
+# RELATIONSHIP GRAPH
+# ============================================================================
+
+# Relationship families in the graph, most specific first: (root class, kind)
+GRAPH_RELATIONS = (
+    ("IfcRelVoidsElement", "voids"),
+    ("IfcRelFillsElement", "fills"),
+    ("IfcRelAggregates", "aggregates"),
+    ("IfcRelNests", "nests"),
+    ("IfcRelAssigns", "assigns"),
+    ("IfcRelConnects", "connects"),
+)
+GRAPH_KINDS = tuple(kind for _, kind in GRAPH_RELATIONS)
+# Spatial containment is already on every record as its storey and would
+# join the whole model into one component
+GRAPH_EXCLUDED = ("IfcRelContainedInSpatialStructure", "IfcRelReferencedInSpatialStructure")
+
+
+class RelationshipGraph:
+    """CSR adjacency over the entities joined by relationships.
+
+    Each relationship adds an edge in both directions between its relating
+    and related objects. Edge i runs from the node owning the indptr slice
+    to indices[i]; kinds[i] indexes GRAPH_KINDS and relating[i] is true when
+    that source node is the relating side.
+    """
+
+    def __init__(self, nodes, guids, classes, names, indptr, indices, kinds, relating):
+        self.nodes = nodes
+        self.guids = guids
+        self.classes = classes
+        self.names = names
+        self.indptr = indptr
+        self.indices = indices
+        self.kinds = kinds
+        self.relating = relating
+        self.node_of = {guid: i for i, guid in enumerate(guids) if guid}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def edge_count(self):
+        return len(self.indices) // 2
+
+    def kind_mask(self, kinds=None):
+        """Boolean mask over GRAPH_KINDS for the requested kinds (all by default)."""
+        mask = np.zeros(len(GRAPH_KINDS), dtype=bool)
+        mask[[GRAPH_KINDS.index(kind) for kind in kinds] if kinds else slice(None)] = True
+        return mask
+
+    def edges_of(self, frontier, mask):
+        """Positions of the allowed edges leaving any node of the frontier."""
+        starts = self.indptr[frontier]
+        lengths = self.indptr[frontier + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        # Concatenated ranges starts[i] .. starts[i] + lengths[i]
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        edges = offsets + np.arange(total)
+        return edges[mask[self.kinds[edges]]]
+
+    def neighbors(self, node, mask):
+        """The direct neighbours of a node as [(node, kind, relating)]."""
+        edges = self.edges_of(np.array([node]), mask)
+        return [(int(self.indices[e]), GRAPH_KINDS[self.kinds[e]], bool(self.relating[e])) for e in edges]
+
+    def k_hop(self, node, k, mask):
+        """Breadth-first search up to k hops; returns (nodes, hop counts) in visiting order."""
+        hops = np.full(len(self.nodes), -1, dtype=np.int32)
+        hops[node] = 0
+        order = [np.array([node])]
+        frontier = order[0]
+        depth = 0
+        while len(frontier) and depth < k:
+            depth += 1
+            reached = np.unique(self.indices[self.edges_of(frontier, mask)])
+            frontier = reached[hops[reached] < 0]
+            hops[frontier] = depth
+            order.append(frontier)
+        visited = np.concatenate(order)
+        return visited, hops[visited]
+
+    def component(self, node, mask):
+        """All nodes reachable from a node."""
+        return self.k_hop(node, len(self.nodes), mask)[0]
+
+    def describe(self, node, **extra):
+        result = {"id": self.guids[node], "class": self.classes[node], "name": self.names[node]}
+        result.update(extra)
+        return result
+
+
+def _relationship_ends(rel, attributes):
+    """The relating and related entities of a relationship.
+
+    Attributes are picked by their Relating*/Related* names, which holds
+    across all relationship classes; enumerations and priorities that share
+    the prefix are dropped because they are not entities.
+    """
+    names = attributes.get(rel.is_a())
+    if names is None:
+        names = [rel.attribute_name(i) for i in range(len(rel))]
+        names = attributes[rel.is_a()] = (
+            [name for name in names if name.startswith("Relating")],
+            [name for name in names if name.startswith("Related")],
+        )
+    ends = []
+    for side in names:
+        entities = []
+        for name in side:
+            value = getattr(rel, name)
+            for entity in (value if isinstance(value, (list, tuple)) else (value,)):
+                if isinstance(entity, ifcopenshell.entity_instance):
+                    entities.append(entity)
+        ends.append(entities)
+    return ends
+
+
+def build_relationship_graph(ifc_file):
+    """Collect the structural relationships of a model into a RelationshipGraph."""
+    sources, targets, kinds = array("q"), array("q"), array("b")
+    seen = set()
+    attributes = {}
+    for root, kind in GRAPH_RELATIONS:
+        try:
+            rels = ifc_file.by_type(root)
+        except RuntimeError:
+            # Not part of this schema
+            continue
+        code = GRAPH_KINDS.index(kind)
+        for rel in rels:
+            if rel.id() in seen or rel.is_a() in GRAPH_EXCLUDED:
+                continue
+            seen.add(rel.id())
+            relating, related = _relationship_ends(rel, attributes)
+            for source in relating:
+                for target in related:
+                    sources.append(source.id())
+                    targets.append(target.id())
+                    kinds.append(code)
+    
+    src = np.frombuffer(sources, dtype=np.int64)
+    dst = np.frombuffer(targets, dtype=np.int64)
+    nodes = np.unique(np.concatenate([src, dst]))
+    rows = np.concatenate([np.searchsorted(nodes, src), np.searchsorted(nodes, dst)])
+    cols = np.concatenate([np.searchsorted(nodes, dst), np.searchsorted(nodes, src)])
+    edge_kinds = np.tile(np.frombuffer(kinds, dtype=np.int8), 2)
+    relating = np.repeat([True, False], len(src))
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(nodes)), out=indptr[1:])
+    
+    guids, classes, names = [], [], []
+    for step_id in nodes.tolist():
+        entity = ifc_file.by_id(step_id)
+        guids.append(getattr(entity, "GlobalId", None))
+        classes.append(_intern(entity.is_a()))
+        names.append(getattr(entity, "Name", None))
+    return RelationshipGraph(nodes, guids, classes, names, indptr,
+                             cols[order].astype(np.int32), edge_kinds[order], relating[order])
+
 
 # ============================================================================
-# FLASK APP SETUP
+# MODEL INDEX
 # ============================================================================
 
-app = Flask(__name__)
-CORS(app)
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB
-app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
+# Measured resident cost of a record with its search, spatial and id index
+# entries, and of each property or quantity value it holds
+MODEL_RECORD_BYTES = 1024
+MODEL_VALUE_BYTES = 16
 
-ALLOWED_EXTENSIONS = {'ifc', 'ifcxml'}
-ALLOWED_IDS_EXTENSIONS = {'ids', 'xml'}
 
-# Store processed files temporarily
-PROCESSED_FILES = {}
+class ModelIndex:
+    """Per-model element records and indexes kept for follow-up queries."""
+
+    def __init__(self, model_id, filename, records, length_scale=1.0):
+        self.model_id = model_id
+        self.filename = filename
+        self.elements = records
+        self.length_scale = length_scale
+        self.positions = {record.id: i for i, record in enumerate(records)}
+        self.spatial = None
+        self.spatial_positions = None
+        self.search = None
+        self.graph = None
+        self._storeys = None
+
+    def set_spatial_index(self, tree, positions):
+        self.spatial = tree
+        self.spatial_positions = positions
+        self._item_of = {int(p): i for i, p in enumerate(positions)}
+
+    def spatial_item(self, position):
+        return self._item_of.get(position)
+
+    def storeys(self):
+        """Return {storey id: (name, bottom, top)} with z extents in metres."""
+        if self._storeys is None:
+            found = {}
+            for record in self.elements:
+                storey = record.storey
+                if storey and storey["id"] not in found:
+                    found[storey["id"]] = storey
+            ordered = sorted(found.values(), key=lambda st: st.get("elevation") or 0.0)
+            self._storeys = {}
+            for i, storey in enumerate(ordered):
+                bottom = (storey.get("elevation") or 0.0) * self.length_scale
+                top = ((ordered[i + 1].get("elevation") or 0.0) * self.length_scale
+                       if i + 1 < len(ordered) else float("inf"))
+                self._storeys[storey["id"]] = (storey["name"], bottom, top)
+        return self._storeys
+
+    def find_storey(self, key):
+        """Look a storey up by GlobalId or name."""
+        storeys = self.storeys()
+        if key in storeys:
+            return key, storeys[key]
+        for storey_id, info in storeys.items():
+            if info[0] == key:
+                return storey_id, info
+        return None, None
+
+    def nbytes(self):
+        """Estimated resident size of the records and indexes, charged to the memory budget."""
+        values = sum(len(record.pset_values) + len(record.qto_values) for record in self.elements)
+        size = len(self.elements) * MODEL_RECORD_BYTES + values * MODEL_VALUE_BYTES
+        if self.graph is not None:
+            size += len(self.graph.guids) * MODEL_RECORD_BYTES // 4
+        return size
+
+    def summary(self, position, **extra):
+        record = self.elements[position]
+        result = {"id": record.id, "name": record.name, "class": record.ifc_class}
+        result.update(extra)
+        return result
+
+
+MODEL_INDEX = LRUCache("models", app.config['MODEL_CACHE_SIZE'], ModelIndex.nbytes)
+ADMISSION.register_cache(MODEL_INDEX)
+
+
+def get_model_index(model_id):
+    """Return the cached ModelIndex or None if it has been evicted."""
+    return MODEL_INDEX.get(model_id)
+
 
 # ============================================================================
-# HELPER FUNCTIONS
+# DATA QUALITY
 # ============================================================================
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+QUALITY_TOP_VALUES = 5
 
 
-def allowed_ids_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IDS_EXTENSIONS
+class PropertyIndex:
+    """All property values of a model as parallel integer arrays.
 
+    There is one entry per (element, property) pair: the element position, the
+    pset.property column and the id of the value, or -1 when it is empty.
+    Reports are then plain NumPy counting over these arrays.
+    """
 
-def get_element_details(ifc_file, element):
-    """Get complete element details."""
-    details = {
-        "id": getattr(element, "GlobalId", ""),
-        "name": getattr(element, "Name", "N/A"),
-        "class": element.is_a(),
-        "predefinedType": getattr(element, "PredefinedType", None),
-        "description": getattr(element, "Description", None),
-    }
+    def __init__(self, records):
+        classes = {}
+        columns = {}
+        layout_columns = {}
+        value_ids = {}
+        self.values = []
+        
+        element_class = array("i")
+        entry_counts = array("i")
+        entry_columns = array("i")
+        entry_values = array("i")
+        for record in records:
+            element_class.append(classes.setdefault(record.ifc_class, len(classes)))
+            layout_cols = layout_columns.get(id(record.pset_layout))
+            if layout_cols is None:
+                layout_cols = layout_columns[id(record.pset_layout)] = array("i", (
+                    columns.setdefault(f"{pset_name}.{prop}", len(columns))
+                    for pset_name, _, names in record.pset_layout for prop in names
+                ))
+            entry_columns.extend(layout_cols)
+            entry_counts.append(len(layout_cols))
+            for value in record.pset_values:
+                if value is None or value == "":
+                    entry_values.append(-1)
+                    continue
+                key = value if type(value) is str else (type(value).__name__, repr(value))
+                value_id = value_ids.get(key)
+                if value_id is None:
+                    value_id = value_ids[key] = len(self.values)
+                    self.values.append(value)
+                entry_values.append(value_id)
+        
+        self.class_names = list(classes)
+        self.column_names = list(columns)
+        self.element_class = np.frombuffer(element_class, dtype=np.int32)
+        counts = np.frombuffer(entry_counts, dtype=np.int32)
+        self.entry_element = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        self.entry_column = np.frombuffer(entry_columns, dtype=np.int32)
+        self.entry_value = np.frombuffer(entry_values, dtype=np.int32)
+
+    def report(self, top=QUALITY_TOP_VALUES):
+        """Fill rates per class and property, distinct-value counts and top values."""
+        n_classes = len(self.class_names)
+        n_columns = max(len(self.column_names), 1)
+        n_values = max(len(self.values), 1)
+        class_totals = np.bincount(self.element_class, minlength=n_classes)
+        entry_class = self.element_class[self.entry_element].astype(np.int64)
+        filled = self.entry_value >= 0
+        
+        # Sparse class x property matrix: every pair where the property occurs
+        cell_keys = np.unique(entry_class * n_columns + self.entry_column)
+        filled_keys, filled_counts = np.unique(
+            entry_class[filled] * n_columns + self.entry_column[filled], return_counts=True)
+        cell_filled = np.zeros(len(cell_keys), dtype=np.int64)
+        cell_filled[np.searchsorted(cell_keys, filled_keys)] = filled_counts
+        cell_class, cell_column = np.divmod(cell_keys, n_columns)
+        cell_total = class_totals[cell_class]
+        
+        # Per property: elements of the classes that use it, and how many fill it
+        applicable = np.bincount(cell_column, weights=cell_total, minlength=n_columns).astype(np.int64)
+        column_filled = np.bincount(cell_column, weights=cell_filled, minlength=n_columns).astype(np.int64)
+        
+        # Distinct values and the most frequent ones per property
+        pair_keys, pair_counts = np.unique(
+            self.entry_column[filled].astype(np.int64) * n_values + self.entry_value[filled],
+            return_counts=True)
+        pair_column, pair_value = np.divmod(pair_keys, n_values)
+        distinct = np.bincount(pair_column, minlength=n_columns)
+        order = np.lexsort((-pair_counts, pair_column))
+        pair_column, pair_value, pair_counts = pair_column[order], pair_value[order], pair_counts[order]
+        starts = np.searchsorted(pair_column, np.arange(n_columns))
+        
+        properties = []
+        for column, name in enumerate(self.column_names):
+            start = starts[column]
+            end = min(start + top, start + distinct[column])
+            properties.append({
+                "property": name,
+                "applicableElements": int(applicable[column]),
+                "filled": int(column_filled[column]),
+                "fillRate": round(float(column_filled[column] / applicable[column]), 4) if applicable[column] else 0.0,
+                "distinctValues": int(distinct[column]),
+                "topValues": [{"value": self.values[v], "count": int(c)}
+                              for v, c in zip(pair_value[start:end], pair_counts[start:end])],
+            })
+        
+        return {
+            "classes": [{"class": name, "count": int(class_totals[i])} for i, name in enumerate(self.class_names)],
+            "properties": properties,
+            "matrix": {
+                "columns": ["class", "property", "filled", "total", "fillRate"],
+                "rows": [
+                    [int(c), int(p), int(f), int(t), round(float(f / t), 4)]
+                    for c, p, f, t in zip(cell_class, cell_column, cell_filled, cell_total)
+                ],
+            },
+        }
+
+
+def get_property_index(model):
+    """Build the model's PropertyIndex on first use."""
+    if getattr(model, "_property_index", None) is None:
+        model._property_index = PropertyIndex(model.elements)
+    return model._property_index
+
+
+# ============================================================================
+# QUANTITY ROLL-UPS
+# ============================================================================
+
+ROLLUP_GROUPINGS = ("material", "classification")
+
+
+class QuantityIndex:
+    """Quantity values of a model as (element, column, value) arrays sorted by column.
+
+    A column is a quantity name and unit, so the same quantity from different
+    quantity sets adds up.
+    """
+
+    def __init__(self, records):
+        columns = {}
+        layout_columns = {}
+        elements, entry_columns, values = array("i"), array("i"), array("d")
+        for position, record in enumerate(records):
+            if not record.qto_values:
+                continue
+            layout_cols = layout_columns.get(id(record.qto_layout))
+            if layout_cols is None:
+                layout_cols = layout_columns[id(record.qto_layout)] = array("i", (
+                    columns.setdefault((name, unit), len(columns)) for name, _, unit in record.qto_layout
+                ))
+            entry_columns.extend(layout_cols)
+            values.extend(record.qto_values)
+            elements.extend(array("i", [position]) * len(layout_cols))
+        
+        self.columns = list(columns)
+        entry_columns = np.frombuffer(entry_columns, dtype=np.int32)
+        order = np.argsort(entry_columns, kind="stable")
+        self.elements = np.frombuffer(elements, dtype=np.int32)[order]
+        self.values = np.frombuffer(values, dtype=np.float64)[order]
+        self.starts = np.searchsorted(entry_columns[order], np.arange(len(self.columns) + 1))
+
+    def column(self, column, size):
+        """Dense float vector of one column over all elements; NaN where missing."""
+        dense = np.full(size, np.nan)
+        start, end = self.starts[column], self.starts[column + 1]
+        dense[self.elements[start:end]] = self.values[start:end]
+        return dense
+
+
+def get_quantity_index(model):
+    """Build the model's QuantityIndex on first use."""
+    if getattr(model, "_quantity_index", None) is None:
+        model._quantity_index = QuantityIndex(model.elements)
+    return model._quantity_index
+
+
+def material_shares(materials):
+    """Split an element between its materials by layer thickness or constituent fraction.
+
+    Falls back to equal shares when the thicknesses or fractions are incomplete.
+    """
+    for field in (2, 3):
+        weights = [m[field] for m in materials]
+        if all(w is not None for w in weights) and sum(weights) > 0:
+            total = sum(weights)
+            return [w / total for w in weights]
+    return [1.0 / len(materials)] * len(materials)
+
+
+def quantity_rollup(model, by, system=None, names=None):
+    """Sum element quantities per material or classification.
+
+    Materials receive their share of each element's quantities; every
+    matching classification of an element receives the full amount.
+    """
+    groups = {}
+    group_elements, group_ids, weights = array("i"), array("i"), array("d")
+    unassigned = 0
+    for position, record in enumerate(model.elements):
+        if by == "material":
+            entries = list(zip((m[0] for m in record.materials), material_shares(record.materials))) \
+                if record.materials else []
+        else:
+            entries = [(c, 1.0) for c in record.classifications if system is None or c[0] == system]
+        if not entries:
+            unassigned += 1
+            continue
+        for key, weight in entries:
+            group_elements.append(position)
+            group_ids.append(groups.setdefault(key, len(groups)))
+            weights.append(weight)
     
-    # Get spatial location
-    location = get_spatial_location(element)
-    details.update(location)
+    n_groups = len(groups)
+    size = max(len(model.elements), 1)
+    # Merge layers of the same material so each element counts once per group
+    pairs, inverse = np.unique(
+        np.frombuffer(group_ids, dtype=np.int32).astype(np.int64) * size
+        + np.frombuffer(group_elements, dtype=np.int32), return_inverse=True)
+    weight = np.bincount(inverse, weights=np.frombuffer(weights, dtype=np.float64), minlength=len(pairs))
+    group, elem = np.divmod(pairs, size)
+    element_counts = np.bincount(group, minlength=n_groups)
     
-    # Get properties
-    psets = Element.get_psets(element)
-    properties = {}
-    for pset_name, props in psets.items():
-        if isinstance(props, dict) and pset_name not in ["id", "type"]:
-            clean_props = {k: v for k, v in props.items() if k not in ["id", "type"]}
-            if clean_props:
-                properties[pset_name] = clean_props
-    details["properties"] = properties
+    index = get_quantity_index(model)
+    column_names = [name for name, _ in index.columns]
+    totals = []
+    for column, (name, unit) in enumerate(index.columns):
+        if names and name not in names:
+            continue
+        values = index.column(column, len(model.elements))[elem]
+        present = ~np.isnan(values)
+        if not present.any():
+            continue
+        sums = np.bincount(group[present], weights=(values * weight)[present], minlength=n_groups)
+        counts = np.bincount(group[present], minlength=n_groups)
+        label = name if column_names.count(name) == 1 else f"{name} [{unit}]"
+        totals.append((label, unit, sums, counts))
     
-    # Get quantities
-    quantities = get_element_quantities(element)
-    details["quantities"] = quantities
+    result = []
+    for key, i in groups.items():
+        entry = {"material": key} if by == "material" else _entry_dict(CLASSIFICATION_FIELDS, key)
+        entry["elements"] = int(element_counts[i])
+        entry["quantities"] = {
+            label: {"value": round(float(sums[i]), 6), "unit": unit, "elements": int(counts[i])}
+            for label, unit, sums, counts in totals if counts[i]
+        }
+        result.append(entry)
+    result.sort(key=lambda entry: -entry["elements"])
+    return {"by": by, "groups": result, "unassigned": unassigned}
+
+
+# ============================================================================
+# TABULAR EXPORT
+# ============================================================================
+
+TABLE_BASE_COLUMNS = ("GlobalId", "Name", "Class", "PredefinedType", "Description", "Storey", "Building")
+TABLE_BATCH_ROWS = 2000
+PARQUET_ROW_GROUP = 50000
+ARROW_BATCH_ROWS = 16384
+
+_XML_ILLEGAL_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def table_columns(model):
+    """Return (property columns, quantity columns) for a model, discovered once."""
+    if getattr(model, "_table_columns", None) is None:
+        properties = set()
+        quantities = {}
+        # Records share their layouts, so each distinct layout is visited once
+        pset_layouts = {id(r.pset_layout): r.pset_layout for r in model.elements}
+        qto_layouts = {id(r.qto_layout): r.qto_layout for r in model.elements}
+        for layout in pset_layouts.values():
+            for pset_name, _, names in layout:
+                properties.update((pset_name, prop) for prop in names)
+        for layout in qto_layouts.values():
+            for qty_name, qset, unit in layout:
+                quantities.setdefault((qset, qty_name), unit)
+        model._table_columns = (sorted(properties), sorted(quantities.items()))
+    return model._table_columns
+
+
+def table_header(model):
+    properties, quantities = table_columns(model)
+    header = list(TABLE_BASE_COLUMNS)
+    header.extend(f"{pset}.{prop}" for pset, prop in properties)
+    header.extend(f"{qset}.{name} [{unit}]" if unit else f"{qset}.{name}" for (qset, name), unit in quantities)
+    return header
+
+
+def iter_table_rows(model):
+    """Yield one flat row per element: base fields, then pset and quantity columns."""
+    properties, quantities = table_columns(model)
+    for record in model.elements:
+        values = {}
+        start = 0
+        for pset_name, _, names in record.pset_layout:
+            values.update(((pset_name, prop), value)
+                          for prop, value in zip(names, record.pset_values[start:start + len(names)]))
+            start += len(names)
+        qtos = {(qset, name): _from_float(value)
+                for (name, qset, _), value in zip(record.qto_layout, record.qto_values)}
+        row = [
+            record.id,
+            record.name,
+            record.ifc_class,
+            record.predefined_type,
+            record.description,
+            (record.storey or {}).get("name"),
+            (record.building or {}).get("name"),
+        ]
+        row.extend(values.get(key) for key in properties)
+        row.extend(qtos.get(key) for key, _ in quantities)
+        yield row
+
+
+class StreamBuffer:
+    """Write-only file object whose contents are drained by a generator."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_csv(model):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(table_header(model))
+    for i, row in enumerate(iter_table_rows(model), 1):
+        writer.writerow(["" if v is None else v for v in row])
+        if i % TABLE_BATCH_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return f"<c><v>{value!r}</v></c>"
+    text = xml_escape(_XML_ILLEGAL_RE.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Elements" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/></Relationships>'),
+}
+
+
+def stream_xlsx(model):
+    """Write a single-sheet XLSX row by row through a streaming zip.
+
+    Strings are stored inline rather than in a shared-strings table, so
+    nothing but the current batch of rows is held in memory.
+    """
+    sink = StreamBuffer()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        yield sink.drain()
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(("<row>" + "".join(_xlsx_cell(v) for v in table_header(model)) + "</row>").encode("utf-8"))
+            batch = []
+            for row in iter_table_rows(model):
+                batch.append("<row>" + "".join(_xlsx_cell(v) for v in row) + "</row>")
+                if len(batch) >= TABLE_BATCH_ROWS:
+                    sheet.write("".join(batch).encode("utf-8"))
+                    batch = []
+                    yield sink.drain()
+            sheet.write(("".join(batch) + "</sheetData></worksheet>").encode("utf-8"))
+    yield sink.drain()
+
+
+def arrow_table(model, batch_rows):
+    """Return the Arrow schema of the element table and a generator of record batches.
+
+    Quantity columns are float64; everything else is stored as strings.
+    """
+    import pyarrow as pa
+    
+    header = table_header(model)
+    _, quantities = table_columns(model)
+    numeric_from = len(header) - len(quantities)
+    schema = pa.schema([
+        pa.field(name, pa.float64() if i >= numeric_from else pa.string())
+        for i, name in enumerate(header)
+    ])
     
-    return details
+    def to_batch(rows):
+        columns = list(zip(*rows))
+        arrays = []
+        for i, column in enumerate(columns):
+            if i >= numeric_from:
+                arrays.append(pa.array(column, type=pa.float64()))
+            else:
+                arrays.append(pa.array([None if v is None else str(v) for v in column], type=pa.string()))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+    
+    def batches():
+        rows = []
+        for row in iter_table_rows(model):
+            rows.append(row)
+            if len(rows) >= batch_rows:
+                yield to_batch(rows)
+                rows = []
+        if rows:
+            yield to_batch(rows)
+    
+    return schema, batches()
 
 
-def get_spatial_location(element):
-    """Get spatial hierarchy location."""
-    location = {"storey": None, "building": None, "site": None}
+def stream_parquet(model):
+    """Write Parquet, one row group per batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
     
-    if hasattr(element, "ContainedInStructure"):
-        for rel in element.ContainedInStructure:
-            if hasattr(rel, "RelatingStructure"):
-                container = rel.RelatingStructure
-                
-                if container.is_a("IfcBuildingStorey"):
-                    location["storey"] = {
-                        "id": getattr(container, "GlobalId", ""),
-                        "name": getattr(container, "Name", ""),
-                        "elevation": getattr(container, "Elevation", None)
-                    }
-                    
-                    if hasattr(container, "Decomposes"):
-                        for dec in container.Decomposes:
-                            if hasattr(dec, "RelatingObject"):
-                                building = dec.RelatingObject
-                                if building.is_a("IfcBuilding"):
-                                    location["building"] = {
-                                        "id": getattr(building, "GlobalId", ""),
-                                        "name": getattr(building, "Name", "")
-                                    }
+    schema, batches = arrow_table(model, PARQUET_ROW_GROUP)
+    sink = StreamBuffer()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    for batch in batches:
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_arrow(model, metadata=None):
+    """Write an Arrow IPC stream; `metadata` is attached to the schema."""
+    import pyarrow as pa
     
-    return location
+    schema, batches = arrow_table(model, ARROW_BATCH_ROWS)
+    sink = StreamBuffer()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema.with_metadata(metadata)) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
 
 
-def get_element_quantities(element):
-    """Extract quantities."""
-    quantities = {}
+TABLE_FORMATS = {
+    "csv": (stream_csv, "text/csv"),
+    "xlsx": (stream_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (stream_parquet, "application/vnd.apache.parquet"),
+    "arrow": (stream_arrow, "application/vnd.apache.arrow.stream"),
+}
+
+
+# ============================================================================
+# NORMALIZED PAYLOAD
+# ============================================================================
+
+# Element rows of the normalized format hold these fields in this order.
+# class/storey/building are table ids; properties are flat
+# [pset, property, value, ...] triples, propertySources [pset, source, ...]
+# pairs and quantities [name, quantity set, unit, value, ...] quads.
+NORMALIZED_COLUMNS = ("id", "name", "class", "predefinedType", "description", "storey",
+                      "building", "properties", "propertySources", "quantities", "geometry",
+                      "materials", "classifications")
+
+
+class DictionaryTable:
+    """Assigns consecutive integer ids to distinct values."""
+
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+
+    def ref(self, value, key=None):
+        if value is None:
+            return None
+        key = value if key is None else key
+        ref = self._ids.get(key)
+        if ref is None:
+            ref = self._ids[key] = len(self.values)
+            self.values.append(value)
+        return ref
+
+
+def normalize_elements(records):
+    """Encode element records as rows referring to shared dictionary tables."""
+    tables = {name: DictionaryTable() for name in
+              ("classes", "storeys", "buildings", "psets", "properties", "quantities", "units", "sources",
+               "materials", "classifications")}
+    classes, storeys, buildings = tables["classes"], tables["storeys"], tables["buildings"]
+    psets, properties, quantities = tables["psets"], tables["properties"], tables["quantities"]
+    units, sources = tables["units"], tables["sources"]
+    materials, classifications = tables["materials"], tables["classifications"]
     
-    if hasattr(element, "IsDefinedBy"):
-        for definition in element.IsDefinedBy:
-            if definition.is_a("IfcRelDefinesByProperties"):
-                prop_def = definition.RelatingPropertyDefinition
-                
-                if prop_def.is_a("IfcElementQuantity"):
-                    qto_name = getattr(prop_def, "Name", "Quantities")
-                    
-                    if hasattr(prop_def, "Quantities"):
-                        for quantity in prop_def.Quantities:
-                            qty_name = getattr(quantity, "Name", "")
-                            value = None
-                            unit = None
-                            
-                            if hasattr(quantity, "LengthValue"):
-                                value = quantity.LengthValue
-                                unit = "m"
-                            elif hasattr(quantity, "AreaValue"):
-                                value = quantity.AreaValue
-                                unit = "m²"
-                            elif hasattr(quantity, "VolumeValue"):
-                                value = quantity.VolumeValue
-                                unit = "m³"
-                            elif hasattr(quantity, "CountValue"):
-                                value = quantity.CountValue
-                                unit = "count"
-                            
-                            if value is not None:
-                                quantities[qty_name] = {
-                                    "value": value,
-                                    "unit": unit,
-                                    "quantitySet": qto_name
-                                }
+    rows = []
+    for record in records:
+        storey = record.storey
+        building = record.building
+        
+        props = []
+        prop_sources = []
+        values = iter(record.pset_values)
+        for pset_name, source, names in record.pset_layout:
+            pset_ref = psets.ref(pset_name)
+            for prop_name in names:
+                props.extend((pset_ref, properties.ref(prop_name), next(values)))
+            if source is not None:
+                prop_sources.extend((pset_ref, sources.ref(source)))
+        
+        qtos = []
+        for (qty_name, qset, unit), value in zip(record.qto_layout, record.qto_values):
+            qtos.extend((quantities.ref(qty_name), psets.ref(qset), units.ref(unit), _from_float(value)))
+        
+        rows.append([
+            record.id,
+            record.name,
+            classes.ref(record.ifc_class),
+            record.predefined_type,
+            record.description,
+            storeys.ref(storey, storey["id"]) if storey else None,
+            buildings.ref(building, building["id"]) if building else None,
+            props,
+            prop_sources,
+            qtos,
+            record.geometry_dict(),
+            [materials.ref(_entry_dict(MATERIAL_FIELDS, m), m) for m in record.materials],
+            [classifications.ref(_entry_dict(CLASSIFICATION_FIELDS, c), c) for c in record.classifications],
+        ])
     
-    return quantities
+    return {
+        "columns": NORMALIZED_COLUMNS,
+        "rows": rows,
+    }, {name: table.values for name, table in tables.items()}
+
+
+# ============================================================================
+# RESPONSE ENCODING
+# ============================================================================
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+
+def msgpack_default(o):
+    """Encode what MessagePack lacks the way JSON responses do; unknown types raise TypeError."""
+    return RecordJSONProvider.default(o)
+
+
+def encode_response(payload, model=None):
+    """Encode a result as JSON, MessagePack or Arrow IPC, chosen by the Accept header.
+
+    Arrow is offered only when the result has an element table (`model`); its
+    stream carries the table and the rest of the payload as schema metadata.
+    Requesting a binary encoding whose package is not installed answers 406.
+    """
+    offered = [JSON_MIMETYPE, *MSGPACK_MIMETYPES]
+    if model is not None:
+        offered.append(ARROW_STREAM_MIMETYPE)
+    mimetype = request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+    
+    try:
+        if mimetype == ARROW_STREAM_MIMETYPE:
+            import pyarrow  # noqa: F401
+            meta = {k: v for k, v in payload.items() if k not in ("elements", "tables")}
+            metadata = {"response": json.dumps(meta, default=str)}
+            return Response(stream_arrow(model, metadata), mimetype=mimetype)
+        if mimetype in MSGPACK_MIMETYPES:
+            import msgpack
+            return Response(msgpack.packb(payload, use_bin_type=True, default=msgpack_default), mimetype=mimetype)
+    except ImportError as e:
+        return jsonify({"success": False, "error": f"{mimetype} needs the '{e.name}' package"}), 406
+    return jsonify(payload)
+
+
+# ============================================================================
+# FEDERATION
+# ============================================================================
+
+STOREY_ELEVATION_TOLERANCE = 0.05  # metres
+
+
+def match_storeys(models):
+    """Group the storeys of several models that share a name and elevation.
+
+    Returns ({(model id, storey id): label}, merged storeys). The label is the
+    storey name, suffixed with its elevation when one name occurs at several heights.
+    """
+    groups = []
+    for model in models:
+        for storey_id, (name, bottom, _) in model.storeys().items():
+            key = (name or "").strip().lower()
+            for group in groups:
+                if group["key"] == key and abs(group["elevation"] - bottom) <= STOREY_ELEVATION_TOLERANCE:
+                    break
+            else:
+                group = {"key": key, "name": name, "elevation": bottom, "members": []}
+                groups.append(group)
+            group["members"].append((model.model_id, storey_id))
+    
+    name_counts = defaultdict(int)
+    for group in groups:
+        name_counts[group["key"]] += 1
+    
+    labels = {}
+    merged = []
+    for group in sorted(groups, key=lambda gr: gr["elevation"]):
+        label = group["name"]
+        if name_counts[group["key"]] > 1:
+            label = f"{group['name']} ({group['elevation']:+.2f} m)"
+        for member in group["members"]:
+            labels[member] = label
+        merged.append({
+            "name": label,
+            "elevation": round(group["elevation"], 4),
+            "models": sorted({model_id for model_id, _ in group["members"]}),
+        })
+    return labels, merged
+
+
+def federated_summary(models):
+    """Merge element counts of several models, counting each GlobalId once."""
+    storey_labels, storeys = match_storeys(models)
+    seen = set()
+    by_class = {}
+    by_storey = {}
+    by_building = {}
+    breakdown = []
+    
+    for model in models:
+        duplicates = 0
+        for record in model.elements:
+            global_id = record.id
+            if global_id:
+                if global_id in seen:
+                    duplicates += 1
+                    continue
+                seen.add(global_id)
+            
+            by_class[record.ifc_class] = by_class.get(record.ifc_class, 0) + 1
+            if record.storey:
+                label = storey_labels[(model.model_id, record.storey["id"])]
+                by_storey[label] = by_storey.get(label, 0) + 1
+            if record.building:
+                building_name = record.building["name"]
+                by_building[building_name] = by_building.get(building_name, 0) + 1
+        
+        breakdown.append({
+            "modelId": model.model_id,
+            "filename": model.filename,
+            "duplicateElements": duplicates,
+            "summary": summarize_elements(model.elements),
+        })
+    
+    return {
+        "summary": make_summary(sum(by_class.values()), by_class, by_storey, by_building),
+        "storeys": storeys,
+        "models": breakdown,
+        "duplicateElements": sum(m["duplicateElements"] for m in breakdown),
+    }
+
+
+def load_federated_upload(file, geometry, group):
+    """Ingest, admit and index one upload of a federated analysis on a worker thread."""
+    timer = StageTimer("federate")
+    timer.job = group
+    spool = ticket = None
+    try:
+        spool = ingest_upload(file)
+        ticket = ADMISSION.acquire(spool.size, spool.schema())
+        model_index, _, _ = load_model(spool, timer, group, geometry=geometry)
+        return model_index
+    finally:
+        if spool:
+            spool.discard()
+        if ticket:
+            ADMISSION.release(ticket)
 
 
 # ============================================================================
 # WEB INTERFACE HTML
 # ============================================================================
 
-INTERFACE_HTML = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>IFC Toolkit - Standalone</title>
-    <style>
+INTERFACE_CSS = """
         * { margin: 0; padding: 0; box-sizing: border-box; }
         
         body {
@@ -232,6 +3567,9 @@ INTERFACE_HTML = """
         .btn-success { background: #48bb78; }
         .btn-success:hover { background: #38a169; }
         
+        .btn-secondary { background: #a0aec0; }
+        .btn-secondary:hover { background: #718096; }
+        
         .results {
             background: white;
             padding: 30px;
@@ -318,6 +3656,25 @@ INTERFACE_HTML = """
             margin: 0 auto 20px;
         }
         
+        .progress {
+            max-width: 480px;
+            height: 10px;
+            margin: 20px auto 10px;
+            background: #f0f0f0;
+            border-radius: 5px;
+            overflow: hidden;
+            display: none;
+        }
+        
+        .progress.show { display: block; }
+        
+        .progress-bar {
+            height: 100%;
+            width: 0;
+            background: #667eea;
+            transition: width 0.25s;
+        }
+        
         @keyframes spin {
             0% { transform: rotate(0deg); }
             100% { transform: rotate(360deg); }
@@ -353,135 +3710,25 @@ INTERFACE_HTML = """
             border: none;
             padding: 5px 10px;
             border-radius: 5px;
-            cursor: pointer;
-            font-size: 0.85em;
-        }
-        
-        .copy-btn:hover { background: #e0e0e0; }
-        
-        .file-info {
-            background: #e6f7ff;
-            padding: 15px;
-            border-radius: 8px;
-            margin: 20px 0;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🏗️ IFC Toolkit Standalone</h1>
-            <p>Professional IFC File Analysis Tool</p>
-        </div>
-        
-        <div class="upload-card">
-            <div class="upload-zone" id="uploadZone">
-                <h2 style="color: #667eea; margin-bottom: 20px;">📁 Upload IFC File</h2>
-                <p style="color: #666; margin-bottom: 20px;">
-                    Drag & drop your IFC file here or click to browse
-                </p>
-                <label for="fileInput" class="btn">
-                    Choose File
-                </label>
-                <input type="file" id="fileInput" accept=".ifc,.ifcxml">
-            </div>
-            
-            <div id="fileInfo" class="file-info" style="display: none;">
-                <strong>Selected:</strong> <span id="fileName"></span>
-                (<span id="fileSize"></span>)
-            </div>
-            
-            <div style="margin-top: 20px; text-align: left; padding: 20px; background: #f8f9ff; border-radius: 8px;">
-                <label style="display: flex; align-items: center; cursor: pointer; font-size: 1em;">
-                    <input type="checkbox" id="correctHeaders" style="width: 20px; height: 20px; margin-right: 10px; cursor: pointer;">
-                    <span style="color: #667eea; font-weight: 600;">
-                        ✅ Apply Header Corrections
-                    </span>
-                </label>
-                <p style="color: #666; font-size: 0.9em; margin: 10px 0 0 30px;">
-                    Automatically correct organization, project, and building information according to standards
-                </p>
-            </div>
-        </div>
+            cursor: pointer;
+            font-size: 0.85em;
+        }
         
-        <div id="loading" class="loading">
-            <div class="spinner"></div>
-            <h3 style="color: #667eea;">Processing IFC file...</h3>
-            <p style="color: #666;">This may take a moment</p>
-        </div>
+        .copy-btn:hover { background: #e0e0e0; }
         
-        <div id="results" class="results">
-            <div class="tabs">
-                <button class="tab active" onclick="switchTab(0)">📊 Summary</button>
-                <button class="tab" onclick="switchTab(1)">🌲 Elements</button>
-                <button class="tab" onclick="switchTab(2)">📏 Quantities</button>
-                <button class="tab" onclick="switchTab(3)">✅ Corrections</button>
-                <button class="tab" onclick="switchTab(4)">🔍 IDS Validation</button>
-            </div>
-            
-            <div class="tab-content active" id="tab-summary">
-                <h2 style="margin-bottom: 20px;">Project Summary</h2>
-                <div class="stats" id="stats"></div>
-                <div id="byClass"></div>
-            </div>
-            
-            <div class="tab-content" id="tab-elements">
-                <div style="display: flex; justify-content: space-between; margin-bottom: 20px;">
-                    <h2>All Elements</h2>
-                    <button class="btn btn-success" onclick="exportToExcel()">
-                        📥 Export to Excel
-                    </button>
-                </div>
-                <div class="element-grid" id="elementGrid"></div>
-            </div>
-            
-            <div class="tab-content" id="tab-quantities">
-                <h2 style="margin-bottom: 20px;">Quantities Summary</h2>
-                <div id="quantitiesTable"></div>
-            </div>
-            
-            <div class="tab-content" id="tab-corrections">
-                <h2 style="margin-bottom: 20px;">Header Corrections Applied</h2>
-                <div id="correctionsTable"></div>
-                <div id="exportSection" style="display: none; margin-top: 30px; text-align: center;">
-                    <button class="btn btn-success" onclick="exportCorrectedFile()">
-                        � Save Corrected IFC File
-                    </button>
-                    <p style="color: #666; margin-top: 10px;">
-                        Download the IFC file with all header corrections applied
-                    </p>
-                </div>
-            </div>
-            
-            <div class="tab-content" id="tab-validation">
-                <h2 style="margin-bottom: 20px;">IDS Validation</h2>
-                <div style="background: #f8f9ff; padding: 20px; border-radius: 10px; margin-bottom: 20px;">
-                    <h3 style="margin-bottom: 15px;">Upload Files for Validation</h3>
-                    <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin-bottom: 20px;">
-                        <div>
-                            <label style="display: block; margin-bottom: 10px; font-weight: 600;">IFC File:</label>
-                            <input type="file" id="validationIfcFile" accept=".ifc,.ifcxml" 
-                                   style="display: block; width: 100%; padding: 10px; border: 2px solid #ddd; border-radius: 5px;">
-                        </div>
-                        <div>
-                            <label style="display: block; margin-bottom: 10px; font-weight: 600;">IDS File:</label>
-                            <input type="file" id="validationIdsFile" accept=".ids,.xml" 
-                                   style="display: block; width: 100%; padding: 10px; border: 2px solid #ddd; border-radius: 5px;">
-                        </div>
-                    </div>
-                    <button class="btn" onclick="runValidation()">
-                        🔍 Run IDS Validation
-                    </button>
-                </div>
-                <div id="validationResults"></div>
-            </div>
-        </div>
-    </div>
+        .file-info {
+            background: #e6f7ff;
+            padding: 15px;
+            border-radius: 8px;
+            margin: 20px 0;
+        }
+"""
 
-    <script>
+INTERFACE_JS = """
         let currentFile = null;
         let elementsData = [];
         let correctedFileId = null;
+        let currentModelId = null;
         
         // File upload handling
         const fileInput = document.getElementById('fileInput');
@@ -521,18 +3768,118 @@ INTERFACE_HTML = """
             }
         }
         
+        const STAGE_LABELS = {
+            pending: 'Waiting for upload', upload: 'Uploading', admission: 'Waiting for capacity',
+            hash: 'Fingerprinting', open: 'Parsing model', correct: 'Correcting headers',
+            extract: 'Extracting elements', geometry: 'Measuring geometry', placement: 'Locating elements',
+            index: 'Building indexes', write: 'Writing corrected file', validate: 'Validating',
+            encode: 'Preparing results'
+        };
+        
+        function newJobId() {
+            return window.crypto && crypto.randomUUID ? crypto.randomUUID() :
+                Date.now().toString(36) + Math.random().toString(36).slice(2);
+        }
+        
+        function formatDuration(seconds) {
+            if (seconds < 60) return Math.ceil(seconds) + 's';
+            return Math.floor(seconds / 60) + 'm ' + Math.ceil(seconds % 60) + 's';
+        }
+        
+        let activeJobId = null;
+        
+        function cancelJob() {
+            if (activeJobId) navigator.sendBeacon(`/api/jobs/${activeJobId}/cancel`);
+        }
+        
+        // Stop server-side work when the tab is closed mid-analysis
+        window.addEventListener('pagehide', cancelJob);
+        
+        function trackProgress(jobId) {
+            activeJobId = jobId;
+            const bar = document.getElementById('progressBar');
+            const text = document.getElementById('progressText');
+            document.getElementById('progress').classList.add('show');
+            bar.style.width = '0';
+            text.textContent = 'This may take a moment';
+            
+            const source = new EventSource(`/api/progress/${jobId}`);
+            source.addEventListener('progress', (event) => {
+                const p = JSON.parse(event.data);
+                let label = STAGE_LABELS[p.stage || p.status] || p.stage || '';
+                if (p.total) {
+                    bar.style.width = Math.min(100, 100 * p.processed / p.total) + '%';
+                    label += ` — ${p.processed.toLocaleString()} / ${p.total.toLocaleString()} ${p.unit}`;
+                    if (p.eta !== null) label += `, about ${formatDuration(p.eta)} left`;
+                } else if (p.processed) {
+                    label += ` — ${p.processed.toLocaleString()} ${p.unit}`;
+                }
+                text.textContent = label;
+                if (p.cancelRequested) text.textContent = 'Cancelling...';
+                if (p.status === 'done' || p.status === 'error' || p.status === 'cancelled') source.close();
+            });
+            return () => {
+                activeJobId = null;
+                source.close();
+                document.getElementById('progress').classList.remove('show');
+            };
+        }
+        
+        // Expand a normalized payload (rows + dictionary tables) into element records
+        function decodeElements(data) {
+            if (data.format !== 'normalized') return data.elements;
+            const t = data.tables;
+            return data.elements.rows.map(row => {
+                const [id, name, cls, predefinedType, description, storey, building,
+                       props, sources, qtos, geometry, materials, classifications] = row;
+                const properties = {};
+                for (let i = 0; i < props.length; i += 3) {
+                    const pset = t.psets[props[i]];
+                    (properties[pset] = properties[pset] || {})[t.properties[props[i + 1]]] = props[i + 2];
+                }
+                const propertySources = {};
+                for (let i = 0; i < sources.length; i += 2) {
+                    propertySources[t.psets[sources[i]]] = t.sources[sources[i + 1]];
+                }
+                const quantities = {};
+                for (let i = 0; i < qtos.length; i += 4) {
+                    quantities[t.quantities[qtos[i]]] = {
+                        quantitySet: t.psets[qtos[i + 1]],
+                        unit: t.units[qtos[i + 2]],
+                        value: qtos[i + 3]
+                    };
+                }
+                const elem = {
+                    id, name, class: t.classes[cls], predefinedType, description,
+                    storey: storey === null ? null : t.storeys[storey],
+                    building: building === null ? null : t.buildings[building],
+                    site: null, properties, propertySources, quantities
+                };
+                if (geometry) elem.geometry = geometry;
+                if (materials.length) elem.materials = materials.map(i => t.materials[i]);
+                if (classifications.length) elem.classifications = classifications.map(i => t.classifications[i]);
+                return elem;
+            });
+        }
+        
         async function processFile() {
             if (!currentFile) return;
             
             document.getElementById('loading').classList.add('show');
             document.getElementById('results').classList.remove('show');
             
+            const jobId = newJobId();
+            const stopProgress = trackProgress(jobId);
+            
             const formData = new FormData();
             formData.append('file', currentFile);
+            formData.append('jobId', jobId);
+            formData.append('format', 'normalized');
             
             // Add correction option
             const correctHeaders = document.getElementById('correctHeaders').checked;
             formData.append('correctHeaders', correctHeaders);
+            formData.append('geometryQuantities', document.getElementById('geometryQuantities').checked);
             
             try {
                 const response = await fetch('/api/analyze', {
@@ -542,9 +3889,13 @@ INTERFACE_HTML = """
                 
                 const data = await response.json();
                 
-                if (data.success) {
+                if (data.cancelled) {
+                    document.getElementById('progressText').textContent = data.error;
+                } else if (data.success) {
+                    data.elements = decodeElements(data);
                     elementsData = data.elements;
                     correctedFileId = data.fileId;
+                    currentModelId = data.modelId;
                     displayResults(data);
                 } else {
                     alert('Error: ' + data.error);
@@ -552,6 +3903,7 @@ INTERFACE_HTML = """
             } catch (error) {
                 alert('Error processing file: ' + error.message);
             } finally {
+                stopProgress();
                 document.getElementById('loading').classList.remove('show');
             }
         }
@@ -666,9 +4018,13 @@ INTERFACE_HTML = """
             
             document.getElementById('loading').classList.add('show');
             
+            const jobId = newJobId();
+            const stopProgress = trackProgress(jobId);
+            
             const formData = new FormData();
             formData.append('ifc_file', ifcFile);
             formData.append('ids_file', idsFile);
+            formData.append('jobId', jobId);
             
             try {
                 const response = await fetch('/api/validate', {
@@ -678,7 +4034,9 @@ INTERFACE_HTML = """
                 
                 const data = await response.json();
                 
-                if (data.success !== false) {
+                if (data.cancelled) {
+                    document.getElementById('progressText').textContent = data.error;
+                } else if (data.success !== false) {
                     displayValidationResults(data);
                 } else {
                     alert('Error: ' + data.error);
@@ -686,6 +4044,7 @@ INTERFACE_HTML = """
             } catch (error) {
                 alert('Error running validation: ' + error.message);
             } finally {
+                stopProgress();
                 document.getElementById('loading').classList.remove('show');
             }
         }
@@ -861,6 +4220,12 @@ INTERFACE_HTML = """
         }
         
         function exportToExcel() {
+            // Stream the full element table from the server when the model is cached
+            if (currentModelId) {
+                window.location.href = `/api/models/${currentModelId}/table.xlsx`;
+                return;
+            }
+            
             // Simple CSV export
             let csv = 'Name,Class,Storey,Volume,Area\\n';
             elementsData.forEach(elem => {
@@ -880,12 +4245,191 @@ INTERFACE_HTML = """
             a.download = 'ifc_elements.csv';
             a.click();
         }
-    </script>
+"""
+
+INTERFACE_HTML = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>IFC Toolkit - Standalone</title>
+    <link rel="stylesheet" href="__APP_CSS__">
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🏗️ IFC Toolkit Standalone</h1>
+            <p>Professional IFC File Analysis Tool</p>
+        </div>
+        
+        <div class="upload-card">
+            <div class="upload-zone" id="uploadZone">
+                <h2 style="color: #667eea; margin-bottom: 20px;">📁 Upload IFC File</h2>
+                <p style="color: #666; margin-bottom: 20px;">
+                    Drag & drop your IFC file here or click to browse
+                </p>
+                <label for="fileInput" class="btn">
+                    Choose File
+                </label>
+                <input type="file" id="fileInput" accept=".ifc,.ifcxml,.ifczip,.gz,.zst">
+            </div>
+            
+            <div id="fileInfo" class="file-info" style="display: none;">
+                <strong>Selected:</strong> <span id="fileName"></span>
+                (<span id="fileSize"></span>)
+            </div>
+            
+            <div style="margin-top: 20px; text-align: left; padding: 20px; background: #f8f9ff; border-radius: 8px;">
+                <label style="display: flex; align-items: center; cursor: pointer; font-size: 1em;">
+                    <input type="checkbox" id="correctHeaders" style="width: 20px; height: 20px; margin-right: 10px; cursor: pointer;">
+                    <span style="color: #667eea; font-weight: 600;">
+                        ✅ Apply Header Corrections
+                    </span>
+                </label>
+                <p style="color: #666; font-size: 0.9em; margin: 10px 0 0 30px;">
+                    Automatically correct organization, project, and building information according to standards
+                </p>
+                <label style="display: flex; align-items: center; cursor: pointer; font-size: 1em; margin-top: 15px;">
+                    <input type="checkbox" id="geometryQuantities" style="width: 20px; height: 20px; margin-right: 10px; cursor: pointer;">
+                    <span style="color: #667eea; font-weight: 600;">
+                        📐 Compute Quantities from Geometry
+                    </span>
+                </label>
+                <p style="color: #666; font-size: 0.9em; margin: 10px 0 0 30px;">
+                    Measure volume, surface area, footprint and bounding box when the model has no quantity sets
+                </p>
+            </div>
+        </div>
+        
+        <div id="loading" class="loading">
+            <div class="spinner"></div>
+            <h3 style="color: #667eea;">Processing IFC file...</h3>
+            <div id="progress" class="progress"><div id="progressBar" class="progress-bar"></div></div>
+            <p id="progressText" style="color: #666;">This may take a moment</p>
+            <button class="btn btn-secondary" onclick="cancelJob()" style="margin-top: 15px;">✖ Cancel</button>
+        </div>
+        
+        <div id="results" class="results">
+            <div class="tabs">
+                <button class="tab active" onclick="switchTab(0)">📊 Summary</button>
+                <button class="tab" onclick="switchTab(1)">🌲 Elements</button>
+                <button class="tab" onclick="switchTab(2)">📏 Quantities</button>
+                <button class="tab" onclick="switchTab(3)">✅ Corrections</button>
+                <button class="tab" onclick="switchTab(4)">🔍 IDS Validation</button>
+            </div>
+            
+            <div class="tab-content active" id="tab-summary">
+                <h2 style="margin-bottom: 20px;">Project Summary</h2>
+                <div class="stats" id="stats"></div>
+                <div id="byClass"></div>
+            </div>
+            
+            <div class="tab-content" id="tab-elements">
+                <div style="display: flex; justify-content: space-between; margin-bottom: 20px;">
+                    <h2>All Elements</h2>
+                    <button class="btn btn-success" onclick="exportToExcel()">
+                        📥 Export to Excel
+                    </button>
+                </div>
+                <div class="element-grid" id="elementGrid"></div>
+            </div>
+            
+            <div class="tab-content" id="tab-quantities">
+                <h2 style="margin-bottom: 20px;">Quantities Summary</h2>
+                <div id="quantitiesTable"></div>
+            </div>
+            
+            <div class="tab-content" id="tab-corrections">
+                <h2 style="margin-bottom: 20px;">Header Corrections Applied</h2>
+                <div id="correctionsTable"></div>
+                <div id="exportSection" style="display: none; margin-top: 30px; text-align: center;">
+                    <button class="btn btn-success" onclick="exportCorrectedFile()">
+                        � Save Corrected IFC File
+                    </button>
+                    <p style="color: #666; margin-top: 10px;">
+                        Download the IFC file with all header corrections applied
+                    </p>
+                </div>
+            </div>
+            
+            <div class="tab-content" id="tab-validation">
+                <h2 style="margin-bottom: 20px;">IDS Validation</h2>
+                <div style="background: #f8f9ff; padding: 20px; border-radius: 10px; margin-bottom: 20px;">
+                    <h3 style="margin-bottom: 15px;">Upload Files for Validation</h3>
+                    <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin-bottom: 20px;">
+                        <div>
+                            <label style="display: block; margin-bottom: 10px; font-weight: 600;">IFC File:</label>
+                            <input type="file" id="validationIfcFile" accept=".ifc,.ifcxml,.ifczip,.gz,.zst" 
+                                   style="display: block; width: 100%; padding: 10px; border: 2px solid #ddd; border-radius: 5px;">
+                        </div>
+                        <div>
+                            <label style="display: block; margin-bottom: 10px; font-weight: 600;">IDS File:</label>
+                            <input type="file" id="validationIdsFile" accept=".ids,.xml" 
+                                   style="display: block; width: 100%; padding: 10px; border: 2px solid #ddd; border-radius: 5px;">
+                        </div>
+                    </div>
+                    <button class="btn" onclick="runValidation()">
+                        🔍 Run IDS Validation
+                    </button>
+                </div>
+                <div id="validationResults"></div>
+            </div>
+        </div>
+    </div>
+
+    <script src="__APP_JS__"></script>
 </body>
 </html>
 """
 
 
+# ============================================================================
+# STATIC ASSETS
+# ============================================================================
+
+class StaticAsset:
+    """Pre-encoded static file served from memory."""
+
+    def __init__(self, data, mimetype):
+        self.data = data
+        self.gzipped = gzip.compress(data, 9)
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(data).hexdigest()[:16]
+
+
+def build_static_assets():
+    """Encode the UI once at startup and give CSS/JS content-hashed names."""
+    assets = {}
+    html = INTERFACE_HTML
+    for placeholder, stem, ext, body, mimetype in (
+        ("__APP_CSS__", "app", "css", INTERFACE_CSS, "text/css"),
+        ("__APP_JS__", "app", "js", INTERFACE_JS, "application/javascript"),
+    ):
+        asset = StaticAsset(body.encode("utf-8"), mimetype)
+        name = f"{stem}.{asset.etag[:12]}.{ext}"
+        assets[name] = asset
+        html = html.replace(placeholder, f"/assets/{name}")
+    index = StaticAsset(html.encode("utf-8"), "text/html")
+    return index, assets
+
+
+INDEX_ASSET, STATIC_ASSETS = build_static_assets()
+
+
+def serve_asset(asset, cache_control):
+    """Return an in-memory asset, gzip-encoded if the client accepts it."""
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = Response(asset.gzipped, mimetype=asset.mimetype)
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(asset.data, mimetype=asset.mimetype)
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = cache_control
+    response.set_etag(asset.etag)
+    return response.make_conditional(request)
+
+
 # ============================================================================
 # HEADER CORRECTION MAPPING
 # ============================================================================
@@ -906,121 +4450,258 @@ HEADER_CORRECTIONS = {
 }
 
 
-def correct_ifc_headers(ifc_file):
+# Where each correction key is checked:
+# (key, report label, root entity, attribute path to the target, attribute)
+CORRECTION_TARGETS = (
+    ("OrganizationName", "Organization Name", "IfcProject",
+     ("OwnerHistory", "OwningUser", "TheOrganization"), "Name"),
+    ("OrganizationDescription", "Organization Description", "IfcProject",
+     ("OwnerHistory", "OwningUser", "TheOrganization"), "Description"),
+    ("Author", "Author", "IfcProject", ("OwnerHistory", "OwningUser"), "GivenName"),
+    ("ProjectName", "Project Name", "IfcProject", (), "Name"),
+    ("ProjectStatus", "Project Status", "IfcProject", (), "Description"),
+    ("BuildingId", "Building ID", "IfcBuilding", (), "Name"),
+    ("SiteCode", "Site Code", "IfcSite", (), "Name"),
+)
+PROFILE_EXTENSIONS = {'json', 'yaml', 'yml'}
+
+
+class ProfileError(Exception):
+    """Correction profile that cannot be loaded."""
+
+
+class CorrectionProfile:
+    """A named set of header corrections, compiled once into targeted rules."""
+
+    def __init__(self, name, corrections, description=""):
+        if not isinstance(corrections, dict):
+            raise ProfileError(f"Profile '{name}': 'corrections' must be a mapping")
+        unknown = set(corrections) - set(HEADER_CORRECTIONS)
+        if unknown:
+            raise ProfileError(f"Profile '{name}': unknown correction keys {sorted(unknown)}")
+        self.name = name
+        self.description = description
+        self.corrections = {key: str(value) for key, value in corrections.items() if value is not None}
+        self.rules = tuple(
+            (key, label, root, path, attribute, self.corrections[key])
+            for key, label, root, path, attribute in CORRECTION_TARGETS
+            if key in self.corrections
+        )
+
+    @classmethod
+    def parse(cls, text, filename):
+        """Compile a profile from JSON or YAML; the name defaults to the file stem."""
+        stem, ext = os.path.splitext(os.path.basename(filename))
+        if ext.lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Install 'pyyaml' to load YAML correction profiles")
+            try:
+                data = yaml.safe_load(text)
+            except yaml.YAMLError as e:
+                raise ProfileError(f"{filename}: {e}")
+        else:
+            try:
+                data = json.loads(text)
+            except ValueError as e:
+                raise ProfileError(f"{filename}: {e}")
+        if not isinstance(data, dict):
+            raise ProfileError(f"{filename}: expected a mapping")
+        return cls(str(data.get("name") or stem), data.get("corrections", {}), data.get("description", ""))
+
+    def apply(self, ifc_file):
+        """Write the rules into an IFC file and report each changed field.
+
+        A rule that cannot be written is logged and skipped; the others
+        still apply.
+        """
+        corrections_applied = []
+        roots = {}
+        for _, label, root, path, attribute, new_val in self.rules:
+            if root not in roots:
+                found = ifc_file.by_type(root)
+                roots[root] = found[0] if found else None
+            target = roots[root]
+            for step in path:
+                target = getattr(target, step, None) if target is not None else None
+            if target is None or not hasattr(target, attribute):
+                continue
+            old_val = getattr(target, attribute)
+            if old_val == new_val:
+                continue
+            try:
+                setattr(target, attribute, new_val)
+            except (RuntimeError, ValueError, TypeError, AttributeError) as e:
+                logger.warning(f"Profile '{self.name}': could not correct {label}: {e}")
+                continue
+            corrections_applied.append({"field": label, "old": old_val, "new": new_val})
+        return corrections_applied
+
+    def as_dict(self):
+        return {"name": self.name, "description": self.description, "corrections": self.corrections}
+
+
+class ProfileRegistry:
+    """Correction profiles by name; 'default' is HEADER_CORRECTIONS."""
+
+    def __init__(self):
+        self._profiles = {"default": CorrectionProfile("default", HEADER_CORRECTIONS)}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            return self._profiles.get(name or "default")
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles[profile.name] = profile
+        return profile
+
+    def all(self):
+        with self._lock:
+            return list(self._profiles.values())
+
+    def load(self, location):
+        """Compile every profile file in a directory, or a single file."""
+        path = Path(location)
+        files = sorted(f for f in path.iterdir() if f.suffix[1:].lower() in PROFILE_EXTENSIONS) \
+            if path.is_dir() else [path]
+        for file in files:
+            try:
+                profile = self.add(CorrectionProfile.parse(file.read_text(encoding="utf-8"), file.name))
+                logger.info(f"Loaded correction profile '{profile.name}' from {file}")
+            except (OSError, ImportError, ProfileError) as e:
+                logger.error(f"Skipping correction profile {file}: {e}")
+
+
+PROFILES = ProfileRegistry()
+if app.config['CORRECTION_PROFILES']:
+    PROFILES.load(app.config['CORRECTION_PROFILES'])
+
+
+def correct_ifc_headers(ifc_file, profile=None):
     """Apply header corrections to IFC file."""
-    corrections_applied = []
+    return (profile or PROFILES.get("default")).apply(ifc_file)
+
+
+def correct_file(source, target, profile):
+    """Correct one IFC file into target; runs in a worker process."""
+    ifc_file = ifcopenshell.open(source)
+    corrections = profile.apply(ifc_file)
+    ifc_file.write(target)
+    return corrections
+
+
+def correct_batch(inputs, profile, output_dir, workers=1, pool=None):
+    """Correct (name, path) inputs on a process pool, yielding reports as they finish.
+
+    Corrected files are written to output_dir as corrected_<name>; names
+    are made unique so that identically named uploads do not collide.
+    Runs on the given pool, or on a private pool of `workers` processes.
+    """
+    outputs = set()
+    tasks = []
+    for name, path in inputs:
+        stem, ext = os.path.splitext(f"corrected_{name}")
+        output, n = stem + ext, 1
+        while output in outputs:
+            n += 1
+            output = f"{stem}_{n}{ext}"
+        outputs.add(output)
+        tasks.append((name, path, output))
     
+    private = pool is None
+    if private:
+        pool = new_correction_pool(min(workers, len(tasks)))
+    futures = {}
     try:
-        # Get project info
-        project = ifc_file.by_type("IfcProject")[0] if ifc_file.by_type("IfcProject") else None
-        
-        if project:
-            # Update Organization
-            if hasattr(project, "OwnerHistory"):
-                owner_history = project.OwnerHistory
-                
-                if hasattr(owner_history, "OwningUser"):
-                    user = owner_history.OwningUser
-                    
-                    if hasattr(user, "TheOrganization") and user.TheOrganization:
-                        org = user.TheOrganization
-                        
-                        # Organization Name
-                        if hasattr(org, "Name"):
-                            old_val = org.Name
-                            new_val = HEADER_CORRECTIONS.get("OrganizationName", old_val)
-                            if old_val != new_val:
-                                corrections_applied.append({
-                                    "field": "Organization Name",
-                                    "old": old_val,
-                                    "new": new_val
-                                })
-                                # Apply correction
-                                ifc_file.create_entity("IfcLabel", new_val)
-                        
-                        # Organization Description
-                        if hasattr(org, "Description"):
-                            old_val = org.Description
-                            new_val = HEADER_CORRECTIONS.get("OrganizationDescription", old_val)
-                            if old_val != new_val:
-                                corrections_applied.append({
-                                    "field": "Organization Description",
-                                    "old": old_val,
-                                    "new": new_val
-                                })
-                    
-                    # Author
-                    if hasattr(user, "GivenName"):
-                        old_val = user.GivenName
-                        new_val = HEADER_CORRECTIONS.get("Author", old_val)
-                        if old_val != new_val:
-                            corrections_applied.append({
-                                "field": "Author",
-                                "old": old_val,
-                                "new": new_val
-                            })
-            
-            # Update Project fields
-            if hasattr(project, "Name"):
-                old_val = project.Name
-                new_val = HEADER_CORRECTIONS.get("ProjectName", old_val)
-                if old_val != new_val:
-                    corrections_applied.append({
-                        "field": "Project Name",
-                        "old": old_val,
-                        "new": new_val
-                    })
-            
-            if hasattr(project, "Description"):
-                old_val = project.Description
-                new_val = HEADER_CORRECTIONS.get("ProjectStatus", old_val)
-                if old_val != new_val:
-                    corrections_applied.append({
-                        "field": "Project Status",
-                        "old": old_val,
-                        "new": new_val
-                    })
-        
-        # Get building
-        buildings = ifc_file.by_type("IfcBuilding")
-        if buildings:
-            building = buildings[0]
-            
-            # Building ID
-            if hasattr(building, "Name"):
-                old_val = building.Name
-                new_val = HEADER_CORRECTIONS.get("BuildingId", old_val)
-                if old_val != new_val:
-                    corrections_applied.append({
-                        "field": "Building ID",
-                        "old": old_val,
-                        "new": new_val
-                    })
-        
-        # Get site
-        sites = ifc_file.by_type("IfcSite")
-        if sites:
-            site = sites[0]
-            
-            # Site Code
-            if hasattr(site, "Name"):
-                old_val = site.Name
-                new_val = HEADER_CORRECTIONS.get("SiteCode", old_val)
-                if old_val != new_val:
-                    corrections_applied.append({
-                        "field": "Site Code",
-                        "old": old_val,
-                        "new": new_val
-                    })
-    
-    except Exception as e:
-        print(f"Warning: Could not apply all corrections: {e}")
+        for name, path, output in tasks:
+            future = pool.submit(correct_file, path, os.path.join(output_dir, output), profile)
+            futures[future] = (name, output)
+        for future in as_completed(futures):
+            name, output = futures[future]
+            try:
+                corrections = future.result()
+            except BrokenProcessPool as e:
+                discard_correction_pool(pool)
+                yield {"file": name, "success": False, "error": str(e) or type(e).__name__}
+            except Exception as e:
+                yield {"file": name, "success": False, "error": str(e) or type(e).__name__}
+            else:
+                yield {"file": name, "success": True, "output": output, "corrections": corrections}
+    finally:
+        if private:
+            pool.shutdown(wait=True, cancel_futures=True)
+        else:
+            # Leave the shared pool running, but drop this batch's queued files
+            # and let its running ones finish before output_dir is removed
+            for future in futures:
+                future.cancel()
+            wait(futures)
+
+
+def new_correction_pool(workers):
+    """Start a process pool for correct_file."""
+    # Forking a threaded server is unsafe, so workers start fresh interpreters
+    import multiprocessing
+    return ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn"))
+
+
+_CORRECTION_POOL = None
+_CORRECTION_POOL_LOCK = threading.Lock()
+
+
+def correction_pool():
+    """The pool shared by all batch requests, so concurrent batches queue for its workers."""
+    global _CORRECTION_POOL
+    with _CORRECTION_POOL_LOCK:
+        if _CORRECTION_POOL is None:
+            _CORRECTION_POOL = new_correction_pool(app.config['CORRECTION_WORKERS'])
+        return _CORRECTION_POOL
+
+
+def discard_correction_pool(pool):
+    """Forget a pool whose worker died; the next batch starts a fresh one."""
+    global _CORRECTION_POOL
+    with _CORRECTION_POOL_LOCK:
+        if _CORRECTION_POOL is pool:
+            _CORRECTION_POOL = None
+
+
+def write_batch_archive(path, output_dir, reports):
+    """Zip the corrected files of the successful reports."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for report in reports:
+            if report["success"]:
+                archive.write(os.path.join(output_dir, report["output"]), report["output"])
+
+
+def run_batch_correction(args):
+    """Command-line batch correction: NDJSON reports on stdout, outputs in a zip."""
+    if os.path.isfile(args.profile):
+        profile = CorrectionProfile.parse(Path(args.profile).read_text(encoding="utf-8"), args.profile)
+    else:
+        profile = PROFILES.get(args.profile)
+        if profile is None:
+            raise ProfileError(f"Unknown correction profile: {args.profile}")
     
-    return corrections_applied
+    inputs = [(os.path.basename(path), path) for path in args.ifc]
+    reports = []
+    with tempfile.TemporaryDirectory(prefix="ifc-batch-") as workdir:
+        for report in correct_batch(inputs, profile, workdir, args.workers):
+            reports.append(report)
+            print(json.dumps(report, default=str), flush=True)
+        write_batch_archive(args.output, workdir, reports)
+    failed = sum(1 for report in reports if not report["success"])
+    print(json.dumps({"done": True, "profile": profile.name, "files": len(reports),
+                      "failed": failed, "archive": args.output}), flush=True)
+    return failed
 
 
-def validate_against_ids(ifc_file, ids_path):
+def validate_against_ids(ifc_file, ids_source, job=None):
     """Validate IFC against IDS file."""
+    job = job or Job(None)
     results = {
         "success": True,
         "totalSpecifications": 0,
@@ -1031,7 +4712,7 @@ def validate_against_ids(ifc_file, ids_path):
     
     try:
         # Parse IDS file
-        tree = ET.parse(ids_path)
+        tree = ET.parse(ids_source)
         root = tree.getroot()
         
         # Get namespace
@@ -1043,6 +4724,7 @@ def validate_against_ids(ifc_file, ids_path):
         specs = root.findall('.//ids:specification', ns) if ns else root.findall('.//specification')
         
         results["totalSpecifications"] = len(specs)
+        job.set_total(len(specs), "specifications")
         
         for spec in specs:
             spec_name = spec.get('name', 'Unnamed Specification')
@@ -1068,11 +4750,17 @@ def validate_against_ids(ifc_file, ids_path):
                     entity_name = entity.find('.//ids:name', ns) if ns else entity.find('.//name')
                     
                     if entity_name is not None:
-                        ifc_class = entity_name.text
+                        # IDS wraps the class in <simpleValue>; older drafts used plain text
+                        simple_value = entity_name.find('.//ids:simpleValue', ns) if ns else entity_name.find('.//simpleValue')
+                        ifc_class = (simple_value.text if simple_value is not None else entity_name.text) or ""
+                        ifc_class = ifc_class.strip()
                         
                         # Get elements of this type
                         try:
+                            if not ifc_class:
+                                raise ValueError("applicability has no entity name")
                             elements = ifc_file.by_type(ifc_class)
+                            resolver = get_pset_resolver(ifc_file)
                             
                             # Check property requirements
                             prop_reqs = requirements.findall('.//ids:property', ns) if ns else requirements.findall('.//property')
@@ -1090,11 +4778,13 @@ def validate_against_ids(ifc_file, ids_path):
                                     
                                     # Check elements
                                     missing_count = 0
-                                    for elem in elements:
-                                        psets = Element.get_psets(elem)
+                                    for i, elem in enumerate(elements, 1):
+                                        psets, _ = resolver.resolve(elem)
                                         
                                         if pset_name not in psets or prop_name not in psets[pset_name]:
                                             missing_count += 1
+                                        if i % PROGRESS_CHUNK == 0:
+                                            job.check()
                                     
                                     if missing_count > 0:
                                         spec_result["passed"] = False
@@ -1102,6 +4792,8 @@ def validate_against_ids(ifc_file, ids_path):
                                             f"{missing_count} elements missing {pset_name}.{prop_name}"
                                         )
                         
+                        except JobCancelled:
+                            raise
                         except Exception as e:
                             spec_result["failures"].append(f"Error checking {ifc_class}: {str(e)}")
                             spec_result["passed"] = False
@@ -1112,7 +4804,10 @@ def validate_against_ids(ifc_file, ids_path):
                 results["passedSpecifications"] += 1
             else:
                 results["failedSpecifications"] += 1
+            job.advance()
     
+    except JobCancelled:
+        raise
     except Exception as e:
         results["success"] = False
         results["error"] = str(e)
@@ -1120,6 +4815,111 @@ def validate_against_ids(ifc_file, ids_path):
     return results
 
 
+# ============================================================================
+# ANALYSIS FILTERS
+# ============================================================================
+
+class FilterError(Exception):
+    """Filter naming a class that is not in the model's schema."""
+
+
+class AnalysisFilter:
+    """Class, storey and pset selections applied before element extraction.
+
+    Classes include their subtypes and are resolved with by_type per class.
+    Storeys (names or GlobalIds) are resolved through the containment
+    relationships, and psets limit which property sets are decoded. The
+    work done then scales with the selection instead of the whole model.
+    """
+
+    def __init__(self, classes=(), storeys=(), psets=()):
+        self.classes = tuple(sorted(set(classes)))
+        self.storeys = frozenset(storeys)
+        self.psets = frozenset(psets)
+
+    @classmethod
+    def from_form(cls, form):
+        def values(name):
+            return [v.strip() for value in form.getlist(name) for v in value.split(",") if v.strip()]
+        return cls(values('classes'), values('storeys'), values('psets'))
+
+    def __bool__(self):
+        return bool(self.classes or self.storeys or self.psets)
+
+    def key(self):
+        """Canonical text of the selection, used to derive the model id."""
+        return json.dumps([self.classes, sorted(self.storeys), sorted(self.psets)])
+
+    def model_id(self, model_hash):
+        if not self:
+            return model_hash
+        return hashlib.sha256(f"{model_hash}:{self.key()}".encode()).hexdigest()
+
+    def select(self, ifc_file):
+        """The selected IfcProducts; raises FilterError for an unknown class."""
+        contained = None
+        if self.storeys:
+            contained = {}
+            for rel in ifc_file.by_type("IfcRelContainedInSpatialStructure"):
+                storey = rel.RelatingStructure
+                if storey.is_a("IfcBuildingStorey") and (
+                        storey.Name in self.storeys or storey.GlobalId in self.storeys):
+                    contained.update((element.id(), element) for element in rel.RelatedElements)
+        if not self.classes:
+            if contained is None:
+                return ifc_file.by_type("IfcProduct")
+            return [contained[key] for key in sorted(contained)]
+        
+        selected = {}
+        for name in self.classes:
+            try:
+                entities = ifc_file.by_type(name)
+            except RuntimeError:
+                raise FilterError(f"Unknown IFC class: {name}")
+            for entity in entities:
+                if (contained is None or entity.id() in contained) and entity.is_a("IfcProduct"):
+                    selected[entity.id()] = entity
+        return [selected[key] for key in sorted(selected)]
+
+    def subtypes(self, schema):
+        """The selected classes with their subtypes in schema, or None for all classes."""
+        if not self.classes:
+            return None
+        classes = set()
+        for name in self.classes:
+            try:
+                classes.update(entity_subtypes(schema, name))
+            except RuntimeError:
+                raise FilterError(f"Unknown IFC class: {name}")
+        return classes
+
+    def storey_selected(self, storey):
+        """Whether a record's storey (a dict with id and name, or None) passes the filter."""
+        return not self.storeys or bool(storey and (
+            storey["name"] in self.storeys or storey["id"] in self.storeys))
+
+    def filter_records(self, records, vocabulary, schema):
+        """Apply the selection to records that were read without push-down (ifcXML).
+
+        Class names are expanded to their subtypes in the given schema.
+        """
+        classes = self.subtypes(schema)
+        selected = []
+        for record in records:
+            if classes is not None and record.ifc_class not in classes:
+                continue
+            if not self.storey_selected(record.storey):
+                continue
+            if self.psets and any(name not in self.psets for name, _, _ in record.pset_layout):
+                props = record.properties()
+                sources = record.property_sources()
+                record.set_properties(
+                    vocabulary, {name: props[name] for name in props if name in self.psets},
+                    {name: sources[name] for name in sources if name in self.psets})
+            selected.append(record)
+        return selected
+
+
 # ============================================================================
 # API ENDPOINTS
 # ============================================================================
@@ -1127,10 +4927,97 @@ def validate_against_ids(ifc_file, ids_path):
 @app.route('/')
 def home():
     """Serve the main interface."""
-    return render_template_string(INTERFACE_HTML)
+    return serve_asset(INDEX_ASSET, "no-cache")
+
+
+@app.route('/assets/<name>')
+def static_asset(name):
+    """Serve content-hashed UI assets with long-lived caching."""
+    asset = STATIC_ASSETS.get(name)
+    if asset is None:
+        return jsonify({"success": False, "error": "Asset not found"}), 404
+    return serve_asset(asset, "public, max-age=31536000, immutable")
+
+
+@app.route('/api/health')
+def health():
+    """Cheap liveness check that never loads ifcopenshell."""
+    return jsonify({"status": "ok", "ifcopenshellLoaded": ifcopenshell.loaded})
+
+
+def load_model(spool, timer, job, profile=None, geometry=False, filters=None):
+    """Parse an ingested upload into a ModelIndex and cache it.
+
+    Header corrections are applied when a CorrectionProfile is given. With
+    an AnalysisFilter only the selected elements are extracted, and the model
+    is cached under an id derived from the file hash and the selection.
+    Returns (model_index, ifc_file, corrections); ifc_file is None for ifcXML.
+    """
+    filters = filters or AnalysisFilter()
+    model_id = filters.model_id(spool.sha256)
+    filename = spool.name
+    ifc_file = None
+    corrections = []
+    origins = None
+    length_scale = 1.0
+    vocabulary = Vocabulary()
+    
+    if is_ifcxml(filename):
+        if profile is not None:
+            reject_ifcxml(filename, "Header correction")
+        if geometry:
+            reject_ifcxml(filename, "Geometry measurement")
+        # Stream ifcXML straight into element records
+        with timer.stage("extract"), spool.open() as stream:
+            reader = IfcXmlReader(stream, vocabulary, job)
+            elements_data = reader.read()
+        if filters:
+            with timer.stage("filter"):
+                elements_data = filters.filter_records(elements_data, vocabulary, reader.schema)
+    else:
+        # Load IFC
+        with timer.stage("open"):
+            ifc_file = spool.open_ifc()
+        length_scale = get_unit_factors(ifc_file).get("LENGTHUNIT", 1.0)
+        
+        if profile is not None:
+            with timer.stage("correct"):
+                corrections = correct_ifc_headers(ifc_file, profile)
+        
+        # Get all elements, or only the selected ones
+        with timer.stage("select"):
+            elements = filters.select(ifc_file)
+        
+        with timer.stage("extract"):
+            elements_data = extract_elements(ifc_file, elements, job, vocabulary, filters.psets)
+        
+        # Optionally measure geometry, cached per model revision and selection
+        if geometry:
+            with timer.stage("geometry"):
+                # Measurements of the whole model already cover any selection
+                measured = GEOMETRY_CACHE.get(spool.sha256) if filters else None
+                if measured is None:
+                    measured = get_geometry_quantities(
+                        ifc_file, model_id, job, elements if filters else None)
+                apply_geometry_quantities(elements_data, measured, vocabulary)
+        
+        with timer.stage("placement"):
+            origins = placement_origins(ifc_file, elements)
+    
+    # Keep records and indexes for follow-up queries on this model
+    with timer.stage("index"):
+        model_index = ModelIndex(model_id, filename, elements_data, length_scale)
+        model_index.set_spatial_index(*build_spatial_index(elements_data, origins))
+        model_index.search = build_search_index(elements_data)
+        # The graph spans the whole file, so a filtered load skips it
+        if ifc_file is not None and not filters:
+            model_index.graph = build_relationship_graph(ifc_file)
+        MODEL_INDEX.put(model_id, model_index)
+    return model_index, ifc_file, corrections
 
 
 @app.route('/api/analyze', methods=['POST'])
+@instrumented("analyze")
 def analyze_file():
     """Analyze IFC file and return all data."""
     if 'file' not in request.files:
@@ -1141,130 +5028,299 @@ def analyze_file():
     if not allowed_file(file.filename):
         return jsonify({"success": False, "error": "Invalid file type"}), 400
     
+    # Check if corrections should be applied, and with which profile
+    apply_corrections = request.form.get('correctHeaders', 'false') == 'true'
+    profile = PROFILES.get(request.form.get('profile')) if apply_corrections else None
+    if apply_corrections and profile is None:
+        return jsonify({"success": False, "error": f"Unknown correction profile: {request.form.get('profile')}"}), 400
+    
+    # Only extract the selected classes, storeys and psets
+    filters = AnalysisFilter.from_form(request.form)
+    
+    timer = current_timer()
+    spool = None
+    ticket = None
+    
     try:
-        # Save file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Load IFC
-        ifc_file = ifcopenshell.open(filepath)
-        
-        # Check if corrections should be applied
-        apply_corrections = request.form.get('correctHeaders', 'false') == 'true'
-        corrections = []
-        
-        if apply_corrections:
-            corrections = correct_ifc_headers(ifc_file)
+        job = start_job(request.form.get('jobId'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    try:
+        # Decompress, hash and spool the upload in one pass
+        with timer.stage("upload"):
+            spool = ingest_upload(file)
+        timer.fields["fileSize"] = spool.size
         
-        # Get all elements
-        elements = ifc_file.by_type("IfcProduct")
+        # Wait for enough memory budget to load the model
+        with timer.stage("admission"):
+            try:
+                ticket = ADMISSION.acquire(spool.size, spool.schema())
+            except AdmissionRejected as e:
+                return admission_error(e)
         
-        # Process elements
-        elements_data = []
-        by_class = {}
-        by_storey = {}
-        by_building = {}
+        # Dashboards only need counts: skip element extraction entirely
+        if request.form.get('summaryOnly', 'false') == 'true':
+            if is_ifcxml(spool.name):
+                timer.fields["schema"] = "IFCXML"
+                with timer.stage("summary"), spool.open() as stream:
+                    reader = IfcXmlReader(stream, job=job, counts_only=True)
+                    reader.parse()
+                    summary = reader.summarize(filters or None)
+            else:
+                with timer.stage("open"):
+                    ifc_file = spool.open_ifc()
+                timer.fields["schema"] = ifc_file.schema
+                with timer.stage("summary"):
+                    summary = summarize_products(filters.select(ifc_file)) if filters else summarize_model(ifc_file)
+            timer.fields["elements"] = summary["totalElements"]
+            return encode_response({"success": True, "summary": summary, "jobId": job.id})
         
-        for element in elements:
-            elem_data = get_element_details(ifc_file, element)
-            elements_data.append(elem_data)
-            
-            # Count by class
-            elem_class = elem_data["class"]
-            by_class[elem_class] = by_class.get(elem_class, 0) + 1
-            
-            # Count by storey
-            if elem_data.get("storey"):
-                storey_name = elem_data["storey"]["name"]
-                by_storey[storey_name] = by_storey.get(storey_name, 0) + 1
-            
-            # Count by building
-            if elem_data.get("building"):
-                building_name = elem_data["building"]["name"]
-                by_building[building_name] = by_building.get(building_name, 0) + 1
+        model_index, ifc_file, corrections = load_model(
+            spool, timer, job, profile,
+            request.form.get('geometryQuantities', 'false') == 'true',
+            filters
+        )
+        model_id = model_index.model_id
+        elements_data = model_index.elements
+        timer.fields["schema"] = ifc_file.schema if ifc_file is not None else "IFCXML"
+        timer.fields["elements"] = len(elements_data)
         
         # Save corrected file if corrections were applied
         file_id = None
         if apply_corrections and corrections:
             file_id = str(uuid.uuid4())
             corrected_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{file_id}_corrected.ifc")
-            ifc_file.write(corrected_path)
+            with timer.stage("write"):
+                ifc_file.write(corrected_path)
             PROCESSED_FILES[file_id] = {
                 'path': corrected_path,
-                'filename': filename,
+                'filename': spool.name,
                 'timestamp': datetime.now()
             }
         
-        # Process elements
-        elements_data = []
-        by_class = {}
-        by_storey = {}
-        by_building = {}
-        
-        for element in elements:
-            elem_data = get_element_details(ifc_file, element)
-            elements_data.append(elem_data)
-            
-            # Count by class
-            elem_class = elem_data["class"]
-            by_class[elem_class] = by_class.get(elem_class, 0) + 1
-            
-            # Count by storey
-            if elem_data.get("storey"):
-                storey_name = elem_data["storey"]["name"]
-                by_storey[storey_name] = by_storey.get(storey_name, 0) + 1
-            
-            # Count by building
-            if elem_data.get("building"):
-                building_name = elem_data["building"]["name"]
-                by_building[building_name] = by_building.get(building_name, 0) + 1
+        # Release the upload before encoding
+        spool.discard()
         
-        # Cleanup original file
-        os.remove(filepath)
-        
-        return jsonify({
-            "success": True,
-            "elements": elements_data,
-            "corrections": corrections,
-            "fileId": file_id,
-            "summary": {
-                "totalElements": len(elements_data),
-                "byClass": by_class,
-                "byStorey": by_storey,
-                "byBuilding": by_building,
-                "uniqueClasses": len(by_class),
-                "uniqueStoreys": len(by_storey),
-                "uniqueBuildings": len(by_building)
+        with timer.stage("encode"):
+            payload = {
+                "success": True,
+                "elements": elements_data,
+                "corrections": corrections,
+                "fileId": file_id,
+                "modelId": model_id,
+                "jobId": job.id,
+                "summary": summarize_elements(elements_data)
             }
-        })
+            if request.values.get('format') == 'normalized':
+                payload["format"] = "normalized"
+                payload["elements"], payload["tables"] = normalize_elements(elements_data)
+            return encode_response(payload, model_index)
+        
+    except UploadError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    
+    except FilterError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    except JobCancelled as e:
+        return jsonify({"success": False, "cancelled": True, "error": str(e)}), e.status
+    
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    
+    finally:
+        if spool:
+            spool.discard()
+        if ticket:
+            ADMISSION.release(ticket)
+
+
+@app.route('/api/federate', methods=['POST'])
+@instrumented("federate")
+def federate_models():
+    """Analyze several models together and merge their summaries."""
+    files = request.files.getlist('files')
+    model_ids = [m for value in request.form.getlist('modelIds') for m in value.split(",") if m.strip()]
+    if not files and not model_ids:
+        return jsonify({"success": False, "error": "Provide 'files' uploads and/or 'modelIds'"}), 400
+    for file in files:
+        if not allowed_file(file.filename):
+            return jsonify({"success": False, "error": f"Invalid file type: {file.filename}"}), 400
+    
+    cached = []
+    for model_id in model_ids:
+        model = get_model_index(model_id.strip())
+        if model is None:
+            return model_not_found(model_id.strip())
+        cached.append(model)
+    
+    timer = current_timer()
+    try:
+        job = start_job(request.form.get('jobId'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    # Workers report to a shared sub-job so one failure stops its siblings
+    group = Job(None, parent=job)
+    geometry = request.form.get('geometryQuantities', 'false') == 'true'
+    uploaded = [None] * len(files)
+    try:
+        with timer.stage("load"):
+            job.set_total(len(files), "models")
+            with ThreadPoolExecutor(max_workers=max(1, app.config['FEDERATION_WORKERS'])) as pool:
+                futures = {pool.submit(load_federated_upload, file, geometry, group): i
+                           for i, file in enumerate(files)}
+                try:
+                    for future in as_completed(futures):
+                        uploaded[futures[future]] = future.result()
+                        job.advance()
+                except BaseException:
+                    group.cancel("Another model of the federation failed")
+                    raise
+        
+        with timer.stage("merge"):
+            result = federated_summary(uploaded + cached)
+        timer.fields["models"] = len(files) + len(cached)
+        timer.fields["elements"] = result["summary"]["totalElements"]
         
+        with timer.stage("encode"):
+            return encode_response({"success": True, "jobId": job.id, **result})
+    
+    except AdmissionRejected as e:
+        return admission_error(e)
+    
+    except UploadError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    
+    except JobCancelled as e:
+        return jsonify({"success": False, "cancelled": True, "error": str(e)}), e.status
+    
     except Exception as e:
-        if os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route('/api/export/<file_id>', methods=['GET'])
+@instrumented("export")
 def export_corrected_file(file_id):
     """Download corrected IFC file."""
     if file_id not in PROCESSED_FILES:
+        CACHE_REQUESTS.inc(cache="processed_files", result="miss")
         return jsonify({"success": False, "error": "File not found"}), 404
     
+    CACHE_REQUESTS.inc(cache="processed_files", result="hit")
     file_info = PROCESSED_FILES[file_id]
     filepath = file_info['path']
     
     if not os.path.exists(filepath):
         return jsonify({"success": False, "error": "File no longer available"}), 404
     
-    return send_file(
-        filepath,
-        as_attachment=True,
-        download_name=f"corrected_{file_info['filename']}"
-    )
+    with current_timer().stage("send"):
+        return send_file(
+            filepath,
+            as_attachment=True,
+            download_name=f"corrected_{file_info['filename']}"
+        )
+
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """List the header correction profiles."""
+    return jsonify({"success": True, "profiles": [profile.as_dict() for profile in PROFILES.all()]})
+
+
+@app.route('/api/profiles', methods=['POST'])
+def upload_profile():
+    """Compile and register a correction profile from a JSON or YAML file."""
+    if 'file' not in request.files:
+        return jsonify({"success": False, "error": "No file provided"}), 400
+    file = request.files['file']
+    if file.filename.rsplit('.', 1)[-1].lower() not in PROFILE_EXTENSIONS:
+        return jsonify({"success": False, "error": "Profiles must be .json, .yaml or .yml"}), 400
+    try:
+        text = file.read().decode("utf-8")
+        profile = PROFILES.add(CorrectionProfile.parse(text, file.filename))
+    except UnicodeDecodeError:
+        return jsonify({"success": False, "error": "Profiles must be UTF-8 text"}), 400
+    except ImportError as e:
+        return jsonify({"success": False, "error": str(e)}), 501
+    except ProfileError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "profile": profile.as_dict()}), 201
+
+
+@app.route('/api/corrections/batch', methods=['POST'])
+@instrumented("correct_batch")
+def correct_batch_files():
+    """Correct many IFC files with one profile, streaming a report per file as NDJSON."""
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({"success": False, "error": "No files provided"}), 400
+    for file in files:
+        if not allowed_file(file.filename) or is_ifcxml(split_compression(file.filename)[0]):
+            return jsonify({"success": False, "error": f"Invalid file type: {file.filename}"}), 400
+    profile = PROFILES.get(request.form.get('profile'))
+    if profile is None:
+        return jsonify({"success": False, "error": f"Unknown correction profile: {request.form.get('profile')}"}), 400
+    
+    timer = current_timer()
+    workdir = tempfile.mkdtemp(prefix="ifc-batch-", dir=app.config['UPLOAD_FOLDER'])
+    inputs = []
+    try:
+        with timer.stage("upload"):
+            for file in files:
+                spool = ingest_upload(file)
+                try:
+                    # An .ifczip may still hold an ifcXML member
+                    reject_ifcxml(spool.name, "Header correction")
+                    path = os.path.join(workdir, f"{len(inputs)}.ifc")
+                    shutil.move(spool.to_file(), path)
+                finally:
+                    spool.discard()
+                inputs.append((spool.name, path))
+    except UploadError as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        return jsonify({"success": False, "error": str(e)}), e.status
+    except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    timer.fields["models"] = len(inputs)
+    
+    def generate():
+        reports = []
+        try:
+            for report in correct_batch(inputs, profile, workdir, pool=correction_pool()):
+                reports.append(report)
+                yield json.dumps(report, default=str) + "\n"
+            
+            batch_id = str(uuid.uuid4())
+            archive = os.path.join(app.config['UPLOAD_FOLDER'], f"{batch_id}_corrected.zip")
+            write_batch_archive(archive, workdir, reports)
+            PROCESSED_FILES[batch_id] = {
+                'path': archive,
+                'filename': f"{profile.name}.zip",
+                'timestamp': datetime.now()
+            }
+            failed = sum(1 for report in reports if not report["success"])
+            yield json.dumps({
+                "done": True,
+                "profile": profile.name,
+                "files": len(reports),
+                "failed": failed,
+                "fileId": batch_id,
+                "download": f"/api/export/{batch_id}",
+            }) + "\n"
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    response = Response(generate(), mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+    # The generator's cleanup never runs if the client leaves before the first line
+    response.call_on_close(lambda: shutil.rmtree(workdir, ignore_errors=True))
+    return response
 
 
 @app.route('/api/validate', methods=['POST'])
+@instrumented("validate")
 def validate_ifc():
     """Validate IFC against IDS file."""
     if 'ifc_file' not in request.files or 'ids_file' not in request.files:
@@ -1279,42 +5335,679 @@ def validate_ifc():
     if not allowed_ids_file(ids_file_upload.filename):
         return jsonify({"success": False, "error": "Invalid IDS file type"}), 400
     
+    timer = current_timer()
+    spool = None
+    ticket = None
+    
     try:
-        # Save files
-        ifc_filename = secure_filename(ifc_file_upload.filename)
-        ids_filename = secure_filename(ids_file_upload.filename)
-        
-        ifc_path = os.path.join(app.config['UPLOAD_FOLDER'], ifc_filename)
-        ids_path = os.path.join(app.config['UPLOAD_FOLDER'], ids_filename)
+        job = start_job(request.form.get('jobId'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    try:
+        # The IDS is parsed straight from the upload; only the model is spooled
+        with timer.stage("upload"):
+            spool = ingest_upload(ifc_file_upload)
+        timer.fields["fileSize"] = spool.size
+        reject_ifcxml(spool.name, "IDS validation")
         
-        ifc_file_upload.save(ifc_path)
-        ids_file_upload.save(ids_path)
+        # Wait for enough memory budget to load the model
+        with timer.stage("admission"):
+            try:
+                ticket = ADMISSION.acquire(spool.size, spool.schema())
+            except AdmissionRejected as e:
+                return admission_error(e)
         
         # Load IFC
-        ifc_file = ifcopenshell.open(ifc_path)
+        with timer.stage("open"):
+            ifc_file = spool.open_ifc()
+        timer.fields["schema"] = ifc_file.schema
+        spool.discard()
         
         # Validate
-        results = validate_against_ids(ifc_file, ids_path)
+        with timer.stage("validate"):
+            results = validate_against_ids(ifc_file, ids_file_upload.stream, job)
         
-        # Cleanup
-        os.remove(ifc_path)
-        os.remove(ids_path)
-        
-        return jsonify(results)
+        with timer.stage("encode"):
+            return encode_response(results)
         
+    except UploadError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    
+    except JobCancelled as e:
+        return jsonify({"success": False, "cancelled": True, "error": str(e)}), e.status
+    
     except Exception as e:
-        if os.path.exists(ifc_path):
-            os.remove(ifc_path)
-        if os.path.exists(ids_path):
-            os.remove(ids_path)
         return jsonify({"success": False, "error": str(e)}), 500
+    
+    finally:
+        if spool:
+            spool.discard()
+        if ticket:
+            ADMISSION.release(ticket)
+
+
+@app.route('/api/progress/<job_id>', methods=['GET'])
+def job_progress(job_id):
+    """Stream progress of an analysis or validation as Server-Sent Events."""
+    if not JOB_ID_RE.match(job_id):
+        return jsonify({"success": False, "error": "Invalid jobId"}), 400
+    return Response(
+        progress_events(JOBS.get_or_create(job_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a running analysis or validation at its next checkpoint."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": f"Job {job_id} not found"}), 404
+    job.cancel()
+    return jsonify({"success": True, "jobId": job_id, "status": job.status})
+
+
+def model_not_found(model_id):
+    return jsonify({"success": False, "error": f"Model {model_id} not loaded; analyze it again"}), 404
+
+
+def parse_point(value, dims=3):
+    """Parse 'x,y,z' query parameters into a list of floats."""
+    parts = [float(v) for v in value.split(",")]
+    if len(parts) != dims:
+        raise ValueError(f"Expected {dims} comma-separated numbers, got '{value}'")
+    return parts
+
+
+@app.route('/api/models/<model_id>/spatial/box', methods=['GET'])
+@instrumented("spatial_box")
+def spatial_box_query(model_id):
+    """Elements whose bounding box intersects a box, optionally limited to a storey."""
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    
+    try:
+        box_min = parse_point(request.args.get('min', ''))
+        box_max = parse_point(request.args.get('max', ''))
+        limit = int(request.args.get('limit', 1000))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    storey_key = request.args.get('storey')
+    storey_id = None
+    if storey_key:
+        storey_id, _ = model.find_storey(storey_key)
+        if storey_id is None:
+            return jsonify({"success": False, "error": f"Unknown storey: {storey_key}"}), 404
+    
+    with current_timer().stage("query"):
+        positions = model.spatial_positions[model.spatial.query(box_min, box_max)]
+        if storey_id:
+            positions = [p for p in positions if (model.elements[p].storey or {}).get("id") == storey_id]
+        matches = [model.summary(int(p)) for p in positions[:limit]]
+    
+    return jsonify({"success": True, "count": len(positions), "elements": matches})
+
+
+@app.route('/api/models/<model_id>/spatial/storey/<storey>', methods=['GET'])
+@instrumented("spatial_storey")
+def spatial_storey_query(model_id, storey):
+    """Elements whose bounding box lies in a storey's height band, optionally within an x/y box."""
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    
+    storey_id, info = model.find_storey(storey)
+    if storey_id is None:
+        return jsonify({"success": False, "error": f"Unknown storey: {storey}"}), 404
+    name, bottom, top = info
+    
+    try:
+        xy_min = parse_point(request.args['min'], 2) if 'min' in request.args else [-float("inf")] * 2
+        xy_max = parse_point(request.args['max'], 2) if 'max' in request.args else [float("inf")] * 2
+        limit = int(request.args.get('limit', 1000))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    with current_timer().stage("query"):
+        # Clip the query to [elevation, next elevation) so elements touching the
+        # slab above are not reported twice
+        top_clip = np.nextafter(top, -np.inf) if np.isfinite(top) else top
+        positions = model.spatial_positions[model.spatial.query(xy_min + [bottom], xy_max + [top_clip])]
+        matches = [model.summary(int(p)) for p in positions[:limit]]
+    
+    return jsonify({
+        "success": True,
+        "storey": {"id": storey_id, "name": name, "bottom": bottom, "top": top if np.isfinite(top) else None},
+        "count": len(positions),
+        "elements": matches
+    })
+
+
+@app.route('/api/models/<model_id>/spatial/nearest', methods=['GET'])
+@instrumented("spatial_nearest")
+def spatial_nearest_query(model_id):
+    """The k elements nearest to an element (by GlobalId) or to a point."""
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    
+    try:
+        k = min(int(request.args.get('k', 10)), 1000)
+        exclude = None
+        if 'element' in request.args:
+            position = model.positions.get(request.args['element'])
+            item = model.spatial_item(position) if position is not None else None
+            if item is None:
+                return jsonify({"success": False, "error": "Element not found in spatial index"}), 404
+            point = (model.spatial.mins[item] + model.spatial.maxs[item]) / 2
+            exclude = item
+        else:
+            point = parse_point(request.args.get('point', ''))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    with current_timer().stage("query"):
+        nearest = model.spatial.nearest(point, k, exclude=exclude)
+        matches = [model.summary(int(model.spatial_positions[item]), distance=distance)
+                   for item, distance in nearest]
+    
+    return jsonify({"success": True, "count": len(matches), "elements": matches})
+
+
+def graph_query(model):
+    """Resolve the start element and relation kinds of a graph query.
+
+    Returns (graph, node, mask); node is None for an element without any
+    relationships. Raises LookupError or ValueError for bad requests.
+    """
+    if model.graph is None:
+        raise LookupError("No relationship graph for this model; analyze the whole STEP file")
+    element = request.args.get('element')
+    if not element:
+        raise ValueError("element=<GlobalId> is required")
+    relations = [r.strip() for r in request.args.get('relations', '').split(',') if r.strip()]
+    unknown = set(relations) - set(GRAPH_KINDS)
+    if unknown:
+        raise ValueError(f"Unknown relations {sorted(unknown)}; use {', '.join(GRAPH_KINDS)}")
+    node = model.graph.node_of.get(element)
+    if node is None and element not in model.positions:
+        raise LookupError(f"Element {element} not found")
+    return model.graph, node, model.graph.kind_mask(relations)
+
+
+def graph_error(e):
+    status = 404 if isinstance(e, LookupError) else 400
+    return jsonify({"success": False, "error": str(e)}), status
+
+
+@app.route('/api/models/<model_id>/graph/neighbors', methods=['GET'])
+@instrumented("graph_neighbors")
+def graph_neighbors(model_id):
+    """Elements directly related to an element, with the relationship kind."""
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    try:
+        graph, node, mask = graph_query(model)
+    except (LookupError, ValueError) as e:
+        return graph_error(e)
+    
+    with current_timer().stage("query"):
+        neighbors = [] if node is None else [
+            graph.describe(other, relation=kind, role="related" if relating else "relating")
+            for other, kind, relating in graph.neighbors(node, mask)
+        ]
+    return jsonify({"success": True, "count": len(neighbors), "neighbors": neighbors})
+
+
+@app.route('/api/models/<model_id>/graph/khop', methods=['GET'])
+@instrumented("graph_khop")
+def graph_k_hop(model_id):
+    """Elements within k relationships of an element."""
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    try:
+        graph, node, mask = graph_query(model)
+        k = max(int(request.args.get('k', 2)), 0)
+        limit = min(int(request.args.get('limit', 1000)), 10000)
+    except (LookupError, ValueError) as e:
+        return graph_error(e)
+    
+    with current_timer().stage("query"):
+        if node is None:
+            visited, hops = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        else:
+            visited, hops = graph.k_hop(node, k, mask)
+            visited, hops = visited[1:], hops[1:]
+        elements = [graph.describe(int(n), hops=int(h)) for n, h in zip(visited[:limit], hops[:limit])]
+    return jsonify({"success": True, "k": k, "total": len(visited), "count": len(elements), "elements": elements})
+
+
+@app.route('/api/models/<model_id>/graph/component', methods=['GET'])
+@instrumented("graph_component")
+def graph_component(model_id):
+    """The connected component containing an element."""
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    try:
+        graph, node, mask = graph_query(model)
+        limit = min(int(request.args.get('limit', 1000)), 10000)
+    except (LookupError, ValueError) as e:
+        return graph_error(e)
+    
+    with current_timer().stage("query"):
+        if node is None:
+            position = model.positions[request.args['element']]
+            elements, size = [model.summary(position)], 1
+        else:
+            component = graph.component(node, mask)
+            elements, size = [graph.describe(int(n)) for n in component[:limit]], len(component)
+    return jsonify({"success": True, "size": size, "count": len(elements), "elements": elements})
+
+
+@app.route('/api/models/<model_id>/table.<fmt>', methods=['GET'])
+@instrumented("table_export")
+def export_table(model_id, fmt):
+    """Stream the flattened element table as CSV, XLSX or Parquet."""
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    if fmt not in TABLE_FORMATS:
+        return jsonify({"success": False, "error": f"Unsupported format: {fmt}"}), 400
+    if fmt in ("parquet", "arrow"):
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return jsonify({"success": False, "error": f"Install 'pyarrow' to export {fmt}"}), 501
+    
+    writer, mimetype = TABLE_FORMATS[fmt]
+    stem = os.path.splitext(model.filename)[0] or "ifc_elements"
+    return Response(
+        writer(model),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{stem}_elements.{fmt}"'}
+    )
+
+
+@app.route('/api/models/<model_id>/quality', methods=['GET'])
+@instrumented("quality")
+def data_quality(model_id):
+    """Property fill rates per class with distinct and most frequent values."""
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    try:
+        top = int(request.args.get('top', QUALITY_TOP_VALUES))
+    except ValueError:
+        return jsonify({"success": False, "error": "top must be an integer"}), 400
+    
+    timer = current_timer()
+    with timer.stage("index"):
+        index = get_property_index(model)
+    with timer.stage("report"):
+        report = index.report(max(top, 0))
+    timer.fields["elements"] = len(model.elements)
+    return jsonify({"success": True, "modelId": model_id, "totalElements": len(model.elements), **report})
+
+
+@app.route('/api/models/<model_id>/rollup', methods=['GET'])
+@instrumented("rollup")
+def rollup_quantities(model_id):
+    """Quantity totals per material or classification code."""
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    by = request.args.get('by', 'material')
+    if by not in ROLLUP_GROUPINGS:
+        return jsonify({"success": False, "error": f"by must be one of {', '.join(ROLLUP_GROUPINGS)}"}), 400
+    names = {n.strip() for n in request.args.get('quantities', '').split(',') if n.strip()}
+    
+    with current_timer().stage("rollup"):
+        result = quantity_rollup(model, by, request.args.get('system'), names)
+    return jsonify({"success": True, "modelId": model_id, **result})
+
+
+@app.route('/api/search', methods=['GET'])
+@instrumented("search")
+def search_elements():
+    """Full-text search over element names, classes, pset names and property values."""
+    model_id = request.args.get('modelId', '')
+    model = get_model_index(model_id)
+    if model is None:
+        return model_not_found(model_id)
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"success": False, "error": "Missing query parameter 'q'"}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', 50)), 1000)
+        with current_timer().stage("query"):
+            ranked, total = model.search.search(query, limit)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    return jsonify({
+        "success": True,
+        "query": query,
+        "count": total,
+        "elements": [model.summary(position, score=round(score, 4)) for position, score in ranked]
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose timings, in-flight requests and cache counters for Prometheus."""
+    return Response(METRICS.expose(), mimetype="text/plain; version=0.0.4")
+
+
+# ============================================================================
+# LOAD TEST
+# ============================================================================
+
+LOADTEST_MIX = "analyze=6,validate=3,export=1"
+
+
+def encode_multipart(fields, files):
+    """Encode form fields and (name, filename, bytes) files as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, content in files:
+        body.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode()
+        )
+        body.write(content)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+class HttpTarget:
+    """Send load-test requests to a running server."""
+
+    def __init__(self, base_url, timeout=300):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, content_type=None):
+        import urllib.request
+        import urllib.error
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if content_type:
+            req.add_header("Content-Type", content_type)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class InProcessTarget:
+    """Send load-test requests to this Flask app through test clients."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, content_type=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = app.test_client()
+        response = client.open(path, method=method, data=body, content_type=content_type)
+        return response.status_code, response.get_data()
+
+
+def parse_metric(text, name):
+    """Return the first sample of an unlabelled metric in Prometheus text format."""
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    return None
+
+
+class LoadTest:
+    """Drive a weighted mix of API requests at a fixed concurrency."""
+
+    def __init__(self, target, ifc_files, ids_file=None, mix=LOADTEST_MIX,
+                 concurrency=4, duration=30.0, max_requests=None, sample_interval=1.0):
+        self.target = target
+        self.uploads = [(Path(path).name, Path(path).read_bytes()) for path in ifc_files]
+        self.ids = (Path(ids_file).name, Path(ids_file).read_bytes()) if ids_file else None
+        self.mix = self.parse_mix(mix)
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.sample_interval = sample_interval
+        self.export_ids = []
+        self.samples = []
+        self.rss = []
+        self._lock = threading.Lock()
+        self._issued = 0
+
+    @staticmethod
+    def parse_mix(mix):
+        weights = {}
+        for part in filter(None, mix.split(",")):
+            name, _, weight = part.partition("=")
+            name = name.strip()
+            if name not in ("analyze", "validate", "export"):
+                raise ValueError(f"Unknown endpoint in mix: {name}")
+            weights[name] = float(weight or 1)
+        if not any(weights.values()):
+            raise ValueError("The request mix is empty")
+        return weights
+
+    def analyze(self, n, correct_headers=False):
+        filename, content = self.uploads[n % len(self.uploads)]
+        body, content_type = encode_multipart(
+            {"correctHeaders": "true" if correct_headers else "false"}, [("file", filename, content)])
+        return self.target.request("POST", "/api/analyze", body, content_type)
+
+    def validate(self, n):
+        filename, content = self.uploads[n % len(self.uploads)]
+        body, content_type = encode_multipart(
+            {}, [("ifc_file", filename, content), ("ids_file", self.ids[0], self.ids[1])])
+        return self.target.request("POST", "/api/validate", body, content_type)
+
+    def export(self, n):
+        return self.target.request("GET", f"/api/export/{self.export_ids[n % len(self.export_ids)]}")
+
+    def prepare(self):
+        """Drop endpoints that cannot run and create the files to export."""
+        if self.mix.get("validate") and self.ids is None:
+            logger.warning("No IDS file given, dropping validate from the mix")
+            self.mix.pop("validate")
+        if self.mix.get("export"):
+            for n in range(len(self.uploads)):
+                status, body = self.analyze(n, correct_headers=True)
+                file_id = json.loads(body).get("fileId") if status == 200 else None
+                if file_id:
+                    self.export_ids.append(file_id)
+            if not self.export_ids:
+                logger.warning("No upload produced a corrected file, dropping export from the mix")
+                self.mix.pop("export")
+        if not self.mix:
+            raise ValueError("No endpoint in the mix can run")
+
+    def _next(self):
+        with self._lock:
+            if self.max_requests is not None and self._issued >= self.max_requests:
+                return None
+            n = self._issued
+            self._issued += 1
+        return n
+
+    def _worker(self, deadline, schedule):
+        while time.perf_counter() < deadline:
+            n = self._next()
+            if n is None:
+                return
+            endpoint = schedule[n % len(schedule)]
+            start = time.perf_counter()
+            try:
+                status, _ = getattr(self, endpoint)(n)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.samples.append((endpoint, start - self.started, elapsed, status))
+
+    def _sample_rss(self, stop):
+        while True:
+            try:
+                status, body = self.target.request("GET", "/metrics")
+                rss = parse_metric(body.decode(), "process_resident_memory_bytes") if status == 200 else None
+            except Exception:
+                rss = None
+            self.rss.append({"t": round(time.perf_counter() - self.started, 3), "bytes": rss})
+            if stop.wait(self.sample_interval):
+                return
+
+    def run(self):
+        self.prepare()
+        # Interleave endpoints in proportion to their weights
+        total = sum(self.mix.values())
+        schedule = []
+        credit = dict.fromkeys(self.mix, 0.0)
+        for _ in range(100):
+            for name, weight in self.mix.items():
+                credit[name] += weight / total
+            name = max(credit, key=credit.get)
+            credit[name] -= 1
+            schedule.append(name)
+        
+        self.started = time.perf_counter()
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample_rss, args=(stop,), daemon=True)
+        sampler.start()
+        deadline = self.started + self.duration if self.duration else math.inf
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for _ in range(self.concurrency):
+                pool.submit(self._worker, deadline, schedule)
+        wall = time.perf_counter() - self.started
+        stop.set()
+        sampler.join()
+        return self.report(wall)
+
+    def report(self, wall):
+        def stats(samples):
+            latencies = np.array([elapsed for _, _, elapsed, _ in samples], dtype=float)
+            statuses = defaultdict(int)
+            for _, _, _, status in samples:
+                statuses[str(status)] += 1
+            errors = sum(1 for _, _, _, status in samples if not (isinstance(status, int) and status < 400))
+            result = {
+                "requests": len(samples),
+                "errors": errors,
+                "errorRate": round(errors / len(samples), 4) if samples else 0.0,
+                "throughput": round(len(samples) / wall, 3) if wall else 0.0,
+                "statuses": dict(statuses),
+            }
+            if samples:
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                result["latency"] = {
+                    "mean": round(float(latencies.mean()), 4),
+                    "p50": round(float(p50), 4),
+                    "p95": round(float(p95), 4),
+                    "p99": round(float(p99), 4),
+                    "max": round(float(latencies.max()), 4),
+                }
+            return result
+        
+        by_endpoint = defaultdict(list)
+        for sample in self.samples:
+            by_endpoint[sample[0]].append(sample)
+        return {
+            "startedAt": datetime.now().isoformat(timespec="seconds"),
+            "target": getattr(self.target, "base_url", "in-process"),
+            "files": [name for name, _ in self.uploads],
+            "mix": self.mix,
+            "concurrency": self.concurrency,
+            "durationSeconds": round(wall, 3),
+            "overall": stats(self.samples),
+            "endpoints": {name: stats(samples) for name, samples in sorted(by_endpoint.items())},
+            "rss": self.rss,
+        }
+
+
+def print_load_report(report):
+    print(f"{report['overall']['requests']} requests in {report['durationSeconds']:.1f}s "
+          f"at concurrency {report['concurrency']} against {report['target']}")
+    print(f"{'endpoint':<10} {'reqs':>6} {'req/s':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, result in [*report["endpoints"].items(), ("overall", report["overall"])]:
+        latency = result.get("latency", {})
+        print(f"{name:<10} {result['requests']:>6} {result['throughput']:>8.2f} "
+              f"{result['errorRate'] * 100:>5.1f}% "
+              + " ".join(f"{latency.get(q, 0) * 1000:>6.0f}ms" for q in ("p50", "p95", "p99")))
+    rss = [sample["bytes"] for sample in report["rss"] if sample["bytes"]]
+    if rss:
+        print(f"server RSS: {rss[0] / 2**20:.0f} MiB at start, {max(rss) / 2**20:.0f} MiB peak, "
+              f"{rss[-1] / 2**20:.0f} MiB at end")
+
+
+def run_load_test(args):
+    target = HttpTarget(args.url) if args.url else InProcessTarget()
+    test = LoadTest(
+        target, args.ifc, ids_file=args.ids, mix=args.mix, concurrency=args.concurrency,
+        duration=args.duration, max_requests=args.requests, sample_interval=args.sample_interval,
+    )
+    report = test.run()
+    print_load_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
 
 
 # ============================================================================
 # MAIN
 # ============================================================================
 
-if __name__ == '__main__':
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="IFC Toolkit - Standalone Version")
+    commands = parser.add_subparsers(dest="command")
+    loadtest = commands.add_parser("loadtest", help="Load-test a running server or this app in-process")
+    loadtest.add_argument("ifc", nargs="+", help="IFC files to upload")
+    loadtest.add_argument("--ids", help="IDS file for /api/validate requests")
+    loadtest.add_argument("--url", help="Base URL of a running server (default: in-process)")
+    loadtest.add_argument("--mix", default=LOADTEST_MIX, help=f"Endpoint weights (default: {LOADTEST_MIX})")
+    loadtest.add_argument("--concurrency", type=int, default=4)
+    loadtest.add_argument("--duration", type=float, default=30.0, help="Seconds to run (0 for no limit)")
+    loadtest.add_argument("--requests", type=int, help="Stop after this many requests")
+    loadtest.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between RSS samples")
+    loadtest.add_argument("--output", help="Write the results as JSON")
+    correct = commands.add_parser("correct", help="Apply a header correction profile to many IFC files")
+    correct.add_argument("ifc", nargs="+", help="IFC files to correct")
+    correct.add_argument("--profile", default="default", help="Profile name or JSON/YAML profile file")
+    correct.add_argument("--workers", type=int, default=app.config['CORRECTION_WORKERS'])
+    correct.add_argument("--output", default="corrected.zip", help="Zip file for the corrected models")
+    args = parser.parse_args(argv)
+    
+    if args.command == "correct":
+        try:
+            failed = run_batch_correction(args)
+        except (ImportError, ProfileError) as e:
+            parser.error(str(e))
+        sys.exit(1 if failed else 0)
+    
+    if args.command == "loadtest":
+        if not args.duration and args.requests is None:
+            parser.error("loadtest needs --duration or --requests")
+        try:
+            LoadTest.parse_mix(args.mix)
+        except ValueError as e:
+            parser.error(str(e))
+        run_load_test(args)
+        return
+    
     print("=" * 60)
     print("🏗️  IFC Toolkit - Standalone Version")
     print("=" * 60)
@@ -1328,3 +6021,7 @@ if __name__ == '__main__':
         port=8080,
         debug=True
     )
+
+
+if __name__ == '__main__':
+    main()
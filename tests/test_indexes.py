@@ -0,0 +1,330 @@
+"""Spatial, search, graph and roll-up indexes checked against small synthetic models."""
+
+import os
+import sys
+
+import ifcopenshell
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ifc_standalone as ifc  # noqa: E402
+
+
+STOREYS = [
+    {"id": "storey-0", "name": "Ground", "elevation": 0.0},
+    {"id": "storey-1", "name": "First", "elevation": 3.0},
+    {"id": "storey-2", "name": "Roof", "elevation": 6.0},
+]
+
+
+def make_record(vocabulary, global_id, ifc_class="IfcWall", name=None, bbox=None, storey=None,
+                properties=None, quantities=None, materials=(), predefined_type=None):
+    geometry = None
+    if bbox is not None:
+        geometry = {"volume": None, "surfaceArea": None, "footprintArea": None,
+                    "bbox": {"min": list(bbox[0]), "max": list(bbox[1])}}
+    quantities = {
+        qty: {"value": value, "unit": "m3", "quantitySet": "Qto_Base"}
+        for qty, value in (quantities or {}).items()
+    }
+    return ifc.ElementRecord(vocabulary, global_id, name, ifc_class, predefined_type, None,
+                             storey, None, properties or {}, {}, quantities, geometry, materials)
+
+
+def random_boxes(rng, count):
+    mins = rng.uniform(0, 50, size=(count, 3))
+    mins[:, 2] = rng.uniform(0, 9, size=count)
+    maxs = mins + rng.uniform(0, 2, size=(count, 3))
+    # Some degenerate boxes, like elements indexed at their placement origin
+    maxs[::7] = mins[::7]
+    return mins, maxs
+
+
+def intersects(mins, maxs, box_min, box_max):
+    return np.all((mins <= box_max) & (maxs >= box_min), axis=1)
+
+
+def box_distances(mins, maxs, point):
+    delta = np.maximum(np.maximum(mins - point, point - maxs), 0)
+    return np.sqrt((delta * delta).sum(axis=1))
+
+
+# ============================================================================
+# SPATIAL INDEX
+# ============================================================================
+
+@pytest.fixture
+def boxes():
+    return random_boxes(np.random.default_rng(7), 500)
+
+
+def test_rtree_box_query_matches_brute_force(boxes):
+    mins, maxs = boxes
+    tree = ifc.RTree(mins, maxs, node_size=4)
+    assert len(tree.levels) > 2
+    rng = np.random.default_rng(11)
+    for _ in range(200):
+        box_min = rng.uniform(-5, 50, size=3)
+        box_max = box_min + rng.uniform(0, 15, size=3)
+        expected = np.nonzero(intersects(mins, maxs, box_min, box_max))[0]
+        assert sorted(tree.query(box_min, box_max).tolist()) == expected.tolist()
+
+
+def test_rtree_query_edges():
+    assert len(ifc.RTree([], []).query([0, 0, 0], [1, 1, 1])) == 0
+    tree = ifc.RTree([[0, 0, 0], [2, 0, 0]], [[1, 1, 1], [3, 1, 1]])
+    # Touching faces count as intersecting
+    assert sorted(tree.query([1, 0, 0], [2, 1, 1]).tolist()) == [0, 1]
+    assert len(tree.query([1.5, 0, 0], [1.6, 1, 1])) == 0
+
+
+def test_rtree_nearest_matches_brute_force(boxes):
+    mins, maxs = boxes
+    tree = ifc.RTree(mins, maxs, node_size=4)
+    rng = np.random.default_rng(13)
+    for _ in range(50):
+        point = rng.uniform(-10, 60, size=3)
+        distances = box_distances(mins, maxs, point)
+        nearest = tree.nearest(point, k=10)
+        assert [d for _, d in nearest] == pytest.approx(np.sort(distances)[:10].tolist())
+        for item, distance in nearest:
+            assert distances[item] == pytest.approx(distance)
+
+
+def test_rtree_nearest_excludes_the_query_element(boxes):
+    mins, maxs = boxes
+    tree = ifc.RTree(mins, maxs, node_size=4)
+    point = (mins[42] + maxs[42]) / 2
+    nearest = tree.nearest(point, k=5, exclude=42)
+    assert len(nearest) == 5
+    assert 42 not in [item for item, _ in nearest]
+    others = np.delete(box_distances(mins, maxs, point), 42)
+    assert [d for _, d in nearest] == pytest.approx(np.sort(others)[:5].tolist())
+
+
+@pytest.fixture
+def spatial_model():
+    """A model of random boxes spread over three storeys, registered in the model cache."""
+    vocabulary = ifc.Vocabulary()
+    mins, maxs = random_boxes(np.random.default_rng(17), 300)
+    records = [
+        make_record(vocabulary, f"el-{i}", bbox=(mins[i], maxs[i]), storey=STOREYS[int(mins[i][2] // 3)])
+        for i in range(len(mins))
+    ]
+    model = ifc.ModelIndex("spatial-test", "synthetic.ifc", records)
+    model.set_spatial_index(*ifc.build_spatial_index(records))
+    ifc.MODEL_INDEX.put(model.model_id, model)
+    yield model, mins, maxs
+    ifc.MODEL_INDEX.evict(float("inf"))
+
+
+def test_storey_bands(spatial_model):
+    model, _, _ = spatial_model
+    assert model.storeys() == {
+        "storey-0": ("Ground", 0.0, 3.0),
+        "storey-1": ("First", 3.0, 6.0),
+        "storey-2": ("Roof", 6.0, float("inf")),
+    }
+    assert model.find_storey("First") == ("storey-1", ("First", 3.0, 6.0))
+    assert model.find_storey("storey-2")[0] == "storey-2"
+    assert model.find_storey("Basement") == (None, None)
+
+
+def test_storey_query_matches_brute_force(spatial_model):
+    model, mins, maxs = spatial_model
+    client = ifc.app.test_client()
+    for storey in STOREYS:
+        _, bottom, top = model.storeys()[storey["id"]]
+        # The band is [elevation, next elevation): boxes that only touch the next slab stay out
+        expected = {f"el-{i}" for i in np.nonzero((mins[:, 2] < top) & (maxs[:, 2] >= bottom))[0]}
+        data = client.get(f"/api/models/{model.model_id}/spatial/storey/{storey['name']}").get_json()
+        assert data["count"] == len(expected)
+        assert {element["id"] for element in data["elements"]} == expected
+
+
+def test_box_query_limited_to_storey_matches_brute_force(spatial_model):
+    model, mins, maxs = spatial_model
+    client = ifc.app.test_client()
+    box_min, box_max = np.array([10.0, 10.0, 0.0]), np.array([30.0, 30.0, 9.0])
+    hits = intersects(mins, maxs, box_min, box_max)
+    storey_of = np.array([record.storey["id"] for record in model.elements])
+    expected = {f"el-{i}" for i in np.nonzero(hits & (storey_of == "storey-1"))[0]}
+    data = client.get(f"/api/models/{model.model_id}/spatial/box",
+                      query_string={"min": "10,10,0", "max": "30,30,9", "storey": "First"}).get_json()
+    assert data["count"] == len(expected)
+    assert {element["id"] for element in data["elements"]} == expected
+
+
+# ============================================================================
+# SEARCH INDEX
+# ============================================================================
+
+@pytest.fixture
+def search_index():
+    vocabulary = ifc.Vocabulary()
+    records = [
+        make_record(vocabulary, "w1", "IfcWall", "Exterior Wall",
+                    properties={"Pset_WallCommon": {"FireRating": "REI60", "IsExternal": True}}),
+        make_record(vocabulary, "w2", "IfcWall", "Interior Partition",
+                    properties={"Pset_WallCommon": {"FireRating": "Door frame seal"}}),
+        make_record(vocabulary, "d1", "IfcDoor", "Door 01", predefined_type="DOOR",
+                    properties={"Pset_DoorCommon": {"FireRating": "EI30"}}),
+        make_record(vocabulary, "s1", "IfcSlab", "Extension Slab"),
+    ]
+    return ifc.build_search_index(records), [record.id for record in records]
+
+
+def found(search_index, query):
+    index, ids = search_index
+    hits, total = index.search(query)
+    assert total == len(hits)
+    return [ids[position] for position, _ in hits]
+
+
+def test_search_prefix(search_index):
+    assert sorted(found(search_index, "ext*")) == ["s1", "w1"]
+    assert found(search_index, "ext") == []
+    assert sorted(found(search_index, "exterior")) == ["w1"]
+
+
+def test_search_field_scoped(search_index):
+    # 'door' is a name, a class part, a predefined type and a property value
+    assert sorted(found(search_index, "door")) == ["d1", "w2"]
+    assert found(search_index, "name:door") == ["d1"]
+    assert found(search_index, "value:door") == ["w2"]
+    assert sorted(found(search_index, "class:wall")) == ["w1", "w2"]
+    assert found(search_index, "pset:doorcommon") == ["d1"]
+    assert found(search_index, "type:door*") == ["d1"]
+
+
+def test_search_splits_camel_case_and_ands_terms(search_index):
+    assert sorted(found(search_index, "pset:common")) == ["d1", "w1", "w2"]
+    assert sorted(found(search_index, "pset:wall*")) == ["w1", "w2"]
+    assert found(search_index, "wall ext*") == ["w1"]
+    assert found(search_index, "class:slab name:wall") == []
+
+
+def test_search_ranks_names_above_values(search_index):
+    # The name match (weight 3) outranks the property value match (weight 1)
+    assert found(search_index, "door") == ["d1", "w2"]
+
+
+def test_search_rejects_unknown_fields(search_index):
+    index, _ = search_index
+    with pytest.raises(ValueError):
+        index.search("colour:red")
+
+
+# ============================================================================
+# RELATIONSHIP GRAPH
+# ============================================================================
+
+@pytest.fixture(scope="module")
+def graph():
+    """Assembly -> two walls, one wall voided by an opening that a door fills,
+    the other wall connected to a third; plus a separate connected pair."""
+    model = ifcopenshell.file(schema="IFC4")
+    guid = ifcopenshell.guid.new
+    names = ("assembly", "w1", "w2", "w3", "opening", "door", "w4", "w5")
+    classes = ("IfcElementAssembly", "IfcWall", "IfcWall", "IfcWall", "IfcOpeningElement", "IfcDoor",
+               "IfcWall", "IfcWall")
+    e = {name: model.create_entity(cls, GlobalId=guid(), Name=name) for name, cls in zip(names, classes)}
+    model.create_entity("IfcRelAggregates", GlobalId=guid(), RelatingObject=e["assembly"],
+                        RelatedObjects=[e["w1"], e["w2"]])
+    model.create_entity("IfcRelVoidsElement", GlobalId=guid(), RelatingBuildingElement=e["w1"],
+                        RelatedOpeningElement=e["opening"])
+    model.create_entity("IfcRelFillsElement", GlobalId=guid(), RelatingOpeningElement=e["opening"],
+                        RelatedBuildingElement=e["door"])
+    model.create_entity("IfcRelConnectsElements", GlobalId=guid(), RelatingElement=e["w2"],
+                        RelatedElement=e["w3"])
+    model.create_entity("IfcRelConnectsElements", GlobalId=guid(), RelatingElement=e["w4"],
+                        RelatedElement=e["w5"])
+    return ifc.build_relationship_graph(model)
+
+
+def node(graph, name):
+    return graph.names.index(name)
+
+
+def named(graph, nodes):
+    return sorted(graph.names[int(n)] for n in nodes)
+
+
+def test_graph_csr(graph):
+    assert len(graph) == 8
+    assert graph.edge_count == 6
+    assert sorted((graph.names[n], kind, relating) for n, kind, relating
+                  in graph.neighbors(node(graph, "w1"), graph.kind_mask())) == [
+        ("assembly", "aggregates", False), ("opening", "voids", True)]
+
+
+def test_graph_k_hop(graph):
+    mask = graph.kind_mask()
+    visited, hops = graph.k_hop(node(graph, "w1"), 0, mask)
+    assert named(graph, visited) == ["w1"]
+    visited, hops = graph.k_hop(node(graph, "w1"), 2, mask)
+    assert {graph.names[n]: int(h) for n, h in zip(visited, hops)} == {
+        "w1": 0, "assembly": 1, "opening": 1, "w2": 2, "door": 2}
+    # Hop counts never decrease in visiting order
+    assert list(hops) == sorted(hops)
+    visited, hops = graph.k_hop(node(graph, "w1"), 3, mask)
+    assert len(visited) == 6
+    assert int(hops[list(visited).index(node(graph, "w3"))]) == 3
+
+
+def test_graph_k_hop_by_relation(graph):
+    visited, _ = graph.k_hop(node(graph, "w1"), 5, graph.kind_mask(["voids", "fills"]))
+    assert named(graph, visited) == ["door", "opening", "w1"]
+
+
+def test_graph_component(graph):
+    mask = graph.kind_mask()
+    assert named(graph, graph.component(node(graph, "door"), mask)) == [
+        "assembly", "door", "opening", "w1", "w2", "w3"]
+    assert named(graph, graph.component(node(graph, "w5"), mask)) == ["w4", "w5"]
+    assert named(graph, graph.component(node(graph, "w2"), graph.kind_mask(["aggregates"]))) == [
+        "assembly", "w1", "w2"]
+    assert named(graph, graph.component(node(graph, "w3"), graph.kind_mask(["voids"]))) == ["w3"]
+
+
+# ============================================================================
+# QUANTITY ROLL-UPS
+# ============================================================================
+
+def layer(name, thickness=None, fraction=None):
+    return (name, None, thickness, fraction)
+
+
+def test_material_shares():
+    assert ifc.material_shares([layer("A", 0.2), layer("B", 0.1), layer("C", 0.1)]) == pytest.approx([0.5, 0.25, 0.25])
+    assert ifc.material_shares([layer("A", fraction=0.3), layer("B", fraction=0.9)]) == pytest.approx([0.25, 0.75])
+    # Incomplete thicknesses fall back to equal shares
+    assert ifc.material_shares([layer("A", 0.2), layer("B")]) == pytest.approx([0.5, 0.5])
+    assert ifc.material_shares([layer("A", 0.0), layer("B", 0.0)]) == pytest.approx([0.5, 0.5])
+
+
+def test_rollup_splits_by_layer_thickness():
+    vocabulary = ifc.Vocabulary()
+    records = [
+        # Concrete appears twice in the build-up and counts the wall once
+        make_record(vocabulary, "w1", quantities={"NetVolume": 8.0},
+                    materials=(layer("Concrete", 0.2), layer("Insulation", 0.1), layer("Concrete", 0.1))),
+        make_record(vocabulary, "w2", quantities={"NetVolume": 3.0},
+                    materials=(layer("Brick", 0.1), layer("Insulation", 0.2))),
+        make_record(vocabulary, "w3", quantities={"NetVolume": 4.0},
+                    materials=(layer("Concrete"), layer("Plaster"))),
+        make_record(vocabulary, "w4", quantities={"NetVolume": 5.0}),
+    ]
+    model = ifc.ModelIndex("rollup-test", "synthetic.ifc", records)
+    result = ifc.quantity_rollup(model, "material")
+    groups = {group["material"]: group for group in result["groups"]}
+    volumes = {name: group["quantities"]["NetVolume"]["value"] for name, group in groups.items()}
+    assert volumes == pytest.approx({"Concrete": 6.0 + 2.0, "Insulation": 2.0 + 2.0, "Brick": 1.0, "Plaster": 2.0})
+    assert {name: group["elements"] for name, group in groups.items()} == {
+        "Concrete": 2, "Insulation": 2, "Brick": 1, "Plaster": 1}
+    assert groups["Concrete"]["quantities"]["NetVolume"]["unit"] == "m3"
+    assert result["unassigned"] == 1
+    # Shares add up to the whole, so nothing is lost or counted twice
+    assert sum(volumes.values()) == pytest.approx(8.0 + 3.0 + 4.0)